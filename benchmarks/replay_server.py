@@ -0,0 +1,152 @@
+"""
+benchmarks/replay_server.py
+
+Local stand-in for NetNutrition that serves the panels in
+fixtures/netnutrition, so the scraping path can be exercised and timed
+without touching cbord.com. Those are hand-built pages mimicking
+NetNutrition's markup, plus any real responses recorded with
+fixtures/capture.py (*_captured_*), see fixtures/goldens.py.
+
+    python benchmarks/replay_server.py --port 8765 --latency 0.08
+    NETNUTRITION_URL=http://127.0.0.1:8765/NetNutrition/replay python main.py
+
+Every unitOid is answered with one of the menuPanel fixtures (the dates in
+it shifted to start today, so nothing is treated as past) and every
+menuOid with one of the itemPanel fixtures. Each request
+waits ``latency`` seconds, plus up to ``jitter`` more, before answering.
+"""
+
+import argparse
+import datetime
+import glob
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+from zoneinfo import ZoneInfo
+
+CORPUS = os.path.join(os.path.dirname(__file__), '..', 'fixtures', 'netnutrition')
+DATE_FORMAT = "%A, %B %d, %Y"
+DATE_PATTERN = re.compile(r"[A-Z][a-z]+day, [A-Z][a-z]+ \d{2}, \d{4}")
+TIMEZONE = ZoneInfo("America/New_York")
+
+
+def _read(pattern: str) -> dict[str, str]:
+    panels = {}
+    for path in sorted(glob.glob(os.path.join(CORPUS, pattern))):
+        with open(path, encoding="utf-8") as file:
+            panels[os.path.basename(path)[:-len(".html")]] = file.read()
+    return panels
+
+
+def _shift_dates(html: str, start: datetime.date) -> str:
+    """Rewrite the panel's day headers to consecutive days from ``start``, in order of appearance."""
+    shifted = {}
+    for text in DATE_PATTERN.findall(html):
+        if text not in shifted:
+            shifted[text] = (start + datetime.timedelta(days=len(shifted))).strftime(DATE_FORMAT)
+    return DATE_PATTERN.sub(lambda m: shifted[m.group(0)], html)
+
+
+class ReplayServer:
+    """
+    Threaded HTTP server replaying the fixtures.
+    ``requests`` counts answered POSTs per endpoint path.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, jitter: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.requests: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        today = datetime.datetime.now(TIMEZONE).date()
+        self.unit_panels = [_shift_dates(html, today) for html in _read("menuPanel_*.html").values()]
+        # Empty panels stand for closed meals; keep them in rotation, but rarer than real menus
+        items = _read("itemPanel_*.html")
+        self.item_panels = [html for name, html in items.items() if name != "itemPanel_empty"] * 3
+        self.item_panels += [html for name, html in items.items() if name == "itemPanel_empty"]
+
+        server = self
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, body: str, content_type: str):
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                server._wait()
+                self._send("<html><body>NetNutrition replay</body></html>", "text/html; charset=utf-8")
+
+            def do_POST(self):
+                form = parse_qs(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode())
+                server._wait()
+                path = self.path.rstrip("/").rsplit("/", 1)[-1]
+                panel = server.panel(path, {key: values[0] for key, values in form.items()})
+                if panel is None:
+                    self.send_error(404)
+                    return
+                with server._lock:
+                    server.requests[path] = server.requests.get(path, 0) + 1
+                self._send(json.dumps({"panels": [panel]}), "application/json; charset=utf-8")
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/NetNutrition/replay"
+
+    def panel(self, path: str, form: dict):
+        if path == "SelectUnitFromUnitsList":
+            html = self.unit_panels[int(form.get("unitOid", 0)) % len(self.unit_panels)]
+            return {"id": "menuPanel", "html": html}
+        if path == "SelectMenu":
+            html = self.item_panels[int(form.get("menuOid", 0)) % len(self.item_panels)]
+            return {"id": "itemPanel", "html": html}
+        return None
+
+    def _wait(self):
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def start(self) -> "ReplayServer":
+        """Serve on a daemon thread and return self."""
+        threading.Thread(target=self.serve_forever, name="replay-server", daemon=True).start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many extra random seconds")
+    args = parser.parse_args()
+    replay = ReplayServer(args.host, args.port, args.latency, args.jitter)
+    print(f"Replaying fixtures on {replay.url}")
+    try:
+        replay.serve_forever()
+    except KeyboardInterrupt:
+        pass
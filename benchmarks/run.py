@@ -0,0 +1,273 @@
+"""
+benchmarks/run.py
+
+Offline benchmarks for the menu pipeline, driven by the fixtures in
+fixtures/netnutrition and the local replay server; nothing touches cbord.com.
+
+The fixtures are small hand-built pages unless real responses have been
+recorded with fixtures/capture.py; real panels are larger, so absolute
+parse and render times from synthetic pages understate production. Use
+the numbers to compare revisions. meta.corpus in the output counts both
+kinds of page.
+
+    python benchmarks/run.py                                 # JSON results on stdout
+    python benchmarks/run.py --output before.json
+    python benchmarks/run.py --output after.json --compare before.json
+
+Benchmarks:
+    parse_menu/<backend>/<fixture>            utils.parser.parse_menu
+    parse_unit_menu_panel/<backend>/<fixture> menu_query._parse_unit_menu_panel
+    diet_filter/<fixture>                     services.diets index build + one filter, per loaded menu
+    render/<language>/<fixture>               translate_many + format_menu, as the bots render
+    fetch_menu_data/cold, fetch_menu_data/warm
+        ``--users`` concurrent simulated users calling fetch_menu_data against
+        the replay server (``--latency`` seconds per upstream response), first
+        with empty caches, then again with the caches warm.
+
+--compare prints the p50 change of every benchmark present in both files and
+exits with status 1 when one got slower by more than ``--threshold``.
+"""
+
+import argparse
+import datetime
+import glob
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from benchmarks.replay_server import CORPUS, ReplayServer
+from utils.chat_executor import percentile
+
+
+def summarize(samples: list[float], **extra) -> dict:
+    """Latency summary of per-call durations (seconds) in milliseconds."""
+    return {
+        'n': len(samples),
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 4),
+        'min_ms': round(min(samples) * 1000, 4),
+        'p50_ms': round(percentile(samples, 50) * 1000, 4),
+        'p95_ms': round(percentile(samples, 95) * 1000, 4),
+        'max_ms': round(max(samples) * 1000, 4),
+        **extra,
+    }
+
+
+def time_calls(fn, rounds: int, number: int) -> list[float]:
+    """Run ``fn`` ``number`` times per round; return the mean per-call time of each round."""
+    fn()  # warm-up, e.g. lazy table loads
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - started) / number)
+    return samples
+
+
+def _fixtures(prefix: str) -> dict[str, str]:
+    fixtures = {}
+    for path in sorted(glob.glob(os.path.join(CORPUS, f"{prefix}_*.html"))):
+        with open(path, encoding="utf-8") as file:
+            fixtures[os.path.basename(path)[len(prefix) + 1:-len(".html")]] = file.read()
+    return fixtures
+
+
+def bench_parsers(rounds: int, number: int) -> dict:
+    from utils.parser import HAS_LXML, parse_menu, parse_unit_menu_panel
+    backends = ["bs4"] + (["lxml"] if HAS_LXML else [])
+    results = {}
+    for backend in backends:
+        for name, html in _fixtures("itemPanel").items():
+            results[f"parse_menu/{backend}/{name}"] = summarize(
+                time_calls(lambda: parse_menu(html, backend=backend), rounds, number), bytes=len(html))
+        for name, html in _fixtures("menuPanel").items():
+            results[f"parse_unit_menu_panel/{backend}/{name}"] = summarize(
+                time_calls(lambda: parse_unit_menu_panel(html, backend=backend), rounds, number), bytes=len(html))
+    return results
+
+
+def bench_diets(rounds: int, number: int) -> dict:
+    from utils.parser import parse_menu_items
+    from services.diets import DietFilter, DietIndex, split_items
+    diet = DietFilter.from_text("vegan, no peanut, no milk")
+    results = {}
+    for name, html in _fixtures("itemPanel").items():
+        menu, record = split_items(parse_menu_items(html))
+        results[f"diet_filter/{name}"] = summarize(
+            time_calls(lambda: DietIndex(menu, record).filter(diet), rounds, number), tags=len(record['tags']))
+    return results
+
+
+def bench_render(rounds: int, number: int, languages: list[str]) -> dict:
+    from utils.parser import parse_menu
+    from utils.formatter import format_menu
+    from utils.translator import translate_many
+
+    def render(menu, language):
+        translated = dict(zip(translate_many(menu.keys(), language),
+                              (translate_many(items, language) for items in menu.values())))
+        return format_menu(translated)
+
+    results = {}
+    for language in languages:
+        for name, html in _fixtures("itemPanel").items():
+            menu = parse_menu(html)
+            results[f"render/{language}/{name}"] = summarize(
+                time_calls(lambda: render(menu, language), rounds, number),
+                dishes=sum(len(items) for items in menu.values()))
+    return results
+
+
+def bench_fetch(server: ReplayServer, users: int, requests_per_user: int, seed: int) -> dict:
+    import config.config as cfg
+    import services.menu_query as menu_query
+
+    # Every (unit, date, meal) the replayed halls publish, as a user could ask for it
+    client = menu_query.get_client()
+    workload = sorted(
+        (hall['pid'], date, meal.lower())
+        for hall in cfg.load_halls()
+        for date, meals in menu_query._get_unit_menu_map(client, hall['pid']).items()
+        for meal in meals
+    )
+
+    def run_phase() -> dict:
+        before = dict(server.requests)
+        latencies, errors = [], []
+        lock = threading.Lock()
+        barrier = threading.Barrier(users)
+
+        def user(index):
+            rng = random.Random(seed + index)
+            barrier.wait()
+            for _ in range(requests_per_user):
+                unit, date, meal = rng.choice(workload)
+                started = time.perf_counter()
+                try:
+                    menu_query.fetch_menu_data(date, meal, unit)
+                except Exception as e:
+                    with lock:
+                        errors.append(repr(e))
+                    continue
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+
+        threads = [threading.Thread(target=user, args=(i,)) for i in range(users)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        upstream = {path: count - before.get(path, 0) for path, count in server.requests.items()}
+        return summarize(latencies or [0.0], users=users, errors=len(errors),
+                         throughput_rps=round(len(latencies) / elapsed, 2),
+                         upstream_requests=upstream)
+
+    menu_query.menu_cache.clear()
+    menu_query.unit_menus_cache.clear()
+    cold = run_phase()
+    warm = run_phase()
+    return {"fetch_menu_data/cold": cold, "fetch_menu_data/warm": warm}
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> bool:
+    """Print the p50 change per benchmark; return False if any regressed beyond ``threshold``."""
+    ok = True
+    for name in sorted(set(results) & set(baseline)):
+        before, after = baseline[name]['p50_ms'], results[name]['p50_ms']
+        change = (after - before) / before if before else 0.0
+        regressed = change > threshold
+        ok &= not regressed
+        print(f"{'SLOWER' if regressed else 'ok    '} {name:55} {before:10.4f} -> {after:10.4f} ms  {change:+.1%}",
+              file=sys.stderr)
+    return ok
+
+
+def _corpus() -> dict:
+    pages = glob.glob(os.path.join(CORPUS, "*.html"))
+    captured = sum("_captured_" in os.path.basename(path) for path in pages)
+    return {'captured': captured, 'synthetic': len(pages) - captured}
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=20, help="timed rounds per micro-benchmark")
+    parser.add_argument("--number", type=int, default=20, help="calls per round")
+    parser.add_argument("--languages", default="Chinese,English", help="comma-separated render languages")
+    parser.add_argument("--users", type=int, default=20, help="concurrent simulated users")
+    parser.add_argument("--requests", type=int, default=10, help="fetch_menu_data calls per user and phase")
+    parser.add_argument("--latency", type=float, default=0.08, help="replay server delay per response (s)")
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", default="parse,diets,render,fetch", help="comma-separated subset to run")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed p50 slowdown for --compare")
+    args = parser.parse_args()
+    only = set(args.only.split(","))
+
+    server = ReplayServer(latency=args.latency, jitter=args.jitter).start()
+    workdir = tempfile.mkdtemp(prefix="wolfbite-bench-")
+    # The config modules read these at import time, so set them before the first import
+    os.environ.update({
+        'NETNUTRITION_URL': server.url,
+        'MENU_STORE_PATH': os.path.join(workdir, 'menus.sqlite3'),
+        'PREFETCH_ENABLED': '0',
+        'METRICS_JSON_LOGS': '0',
+    })
+    import utils.translator as translator
+    # Keep benchmark misses out of the real translations/untranslated.json
+    translator.UNTRANSLATED_PATH = os.path.join(workdir, 'untranslated.json')
+
+    results = {}
+    if "parse" in only:
+        results.update(bench_parsers(args.rounds, args.number))
+    if "diets" in only:
+        results.update(bench_diets(args.rounds, args.number))
+    if "render" in only:
+        results.update(bench_render(args.rounds, args.number, args.languages.split(",")))
+    if "fetch" in only:
+        results.update(bench_fetch(server, args.users, args.requests, args.seed))
+    server.stop()
+
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'args': vars(args),
+            'corpus': _corpus(),
+        },
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)['results']
+        sys.exit(0 if compare(results, baseline, args.threshold) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+benchmarks/telegram_webhook_harness.py
+
+Drives the Telegram bot in webhook mode with synthetic updates, without
+touching Telegram or cbord.com:
+
+  - a fake Bot API server records every reply the bot sends (sendMessage,
+    editMessageText, ...) per chat;
+  - the replay server stands in for NetNutrition;
+  - the bot's real handlers run behind bots.telegram_webhook.WebhookServer.
+
+Each simulated user walks the whole conversation (/start, pick a hall, pick a
+period) by POSTing Update JSON to the webhook, and the harness times each step
+from POST to the reply that completes it. Results are printed as JSON in the
+same shape as benchmarks/run.py.
+
+    python benchmarks/telegram_webhook_harness.py --users 50 --latency 0.08
+"""
+
+import argparse
+import datetime
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from benchmarks.replay_server import ReplayServer
+from benchmarks.run import summarize
+
+TOKEN = "123456:harness"
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "WolfBite", "username": "wolfbite_harness_bot"}
+SECRET = "harness-secret"
+
+
+class FakeBotAPI:
+    """
+    Minimal Bot API: answers the methods the bot calls and counts, per chat,
+    how many times each method was called so callers can wait for replies.
+    """
+
+    def __init__(self):
+        self._counts: dict[tuple[int, str], int] = {}
+        self._changed = threading.Condition()
+        self._message_ids = itertools.count(1)
+
+        api = self
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                try:
+                    params = json.loads(body) if body else {}
+                except ValueError:
+                    params = {}
+                result = api.call(self.path.rsplit("/", 1)[-1], params)
+                data = json.dumps({"ok": True, "result": result}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, name="fake-bot-api", daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._httpd.server_address[1]}/bot"
+
+    def call(self, method: str, params: dict):
+        if method == "getMe":
+            return BOT_USER
+        chat_id = params.get("chat_id")
+        if chat_id is not None:
+            with self._changed:
+                key = (int(chat_id), method)
+                self._counts[key] = self._counts.get(key, 0) + 1
+                self._changed.notify_all()
+        if method in ("sendMessage", "editMessageText"):
+            return {"message_id": next(self._message_ids), "date": int(time.time()), "from": BOT_USER,
+                    "chat": {"id": int(chat_id or 0), "type": "private"}, "text": params.get("text", "")}
+        return True
+
+    def count(self, chat_id: int, method: str) -> int:
+        with self._changed:
+            return self._counts.get((chat_id, method), 0)
+
+    def wait_for(self, chat_id: int, method: str, count: int, timeout: float) -> bool:
+        with self._changed:
+            return self._changed.wait_for(lambda: self._counts.get((chat_id, method), 0) >= count, timeout)
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+_update_ids = itertools.count(1)
+
+def _user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+
+def command_update(user_id: int, text: str) -> dict:
+    return {"update_id": next(_update_ids), "message": {
+        "message_id": next(_update_ids), "date": int(time.time()), "text": text,
+        "chat": {"id": user_id, "type": "private"}, "from": _user(user_id),
+        "entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}],
+    }}
+
+def callback_update(user_id: int, data: str) -> dict:
+    return {"update_id": next(_update_ids), "callback_query": {
+        "id": str(next(_update_ids)), "from": _user(user_id), "chat_instance": str(user_id), "data": data,
+        "message": {"message_id": 1, "date": int(time.time()), "text": "...", "from": BOT_USER,
+                    "chat": {"id": user_id, "type": "private"}},
+    }}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20, help="concurrent simulated users")
+    parser.add_argument("--rounds", type=int, default=3, help="conversations per user")
+    parser.add_argument("--latency", type=float, default=0.08, help="replay server delay per response (s)")
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--max-connections", type=int, default=40)
+    parser.add_argument("--timeout", type=float, default=30, help="seconds to wait for each reply")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    replay = ReplayServer(latency=args.latency, jitter=args.jitter).start()
+    api = FakeBotAPI()
+    workdir = tempfile.mkdtemp(prefix="wolfbite-webhook-")
+    # The config modules read these at import time, so set them before the first import
+    os.environ.update({
+        'TELEGRAM_TOKEN': TOKEN,
+        'TELEGRAM_API_URL': api.url,
+        'NETNUTRITION_URL': replay.url,
+        'MENU_STORE_PATH': os.path.join(workdir, 'menus.sqlite3'),
+        'USER_STATE_PATH': os.path.join(workdir, 'users.sqlite3'),
+        'SUBSCRIPTIONS_PATH': os.path.join(workdir, 'subscriptions.sqlite3'),
+        'PREFETCH_ENABLED': '0',
+        'METRICS_JSON_LOGS': '0',
+    })
+    import config.config as cfg
+    import utils.translator as translator
+    translator.UNTRANSLATED_PATH = os.path.join(workdir, 'untranslated.json')
+    import bots.telegram_bot as telegram_bot
+    from bots.telegram_webhook import WebhookServer
+
+    updater = telegram_bot.create_updater(cfg.load_tg_config())
+    webhook = WebhookServer(updater.dispatcher, SECRET, "127.0.0.1", 0, "telegram", args.max_connections)
+    threading.Thread(target=updater.dispatcher.start, name="tg-dispatcher", daemon=True).start()
+    threading.Thread(target=webhook.serve_forever, name="webhook", daemon=True).start()
+    webhook_url = f"http://127.0.0.1:{webhook.port}/telegram"
+
+    rejected = requests.post(webhook_url, json=command_update(1, "/start"),
+                             headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"}).status_code
+
+    registry = cfg.get_registry()
+    # (update builder, Bot API method that completes the step, replies of that method it takes)
+    steps = {
+        "start": (lambda uid, rng: command_update(uid, "/start"), "sendMessage", 2),
+        "hall": (lambda uid, rng: callback_update(uid, rng.choice(registry.halls)['pid']), "editMessageText", 1),
+        "period": (lambda uid, rng: callback_update(uid, rng.choice(registry.periods)), "editMessageText", 2),
+    }
+    latencies = {name: [] for name in steps}
+    flows, failures = [], []
+    lock = threading.Lock()
+    barrier = threading.Barrier(args.users)
+
+    def user(index):
+        uid = 100000 + index
+        rng = random.Random(args.seed + index)
+        session = requests.Session()
+        barrier.wait()
+        for _ in range(args.rounds):
+            flow_started = time.perf_counter()
+            for name, (build, method, replies) in steps.items():
+                expected = api.count(uid, method) + replies
+                started = time.perf_counter()
+                status = session.post(webhook_url, json=build(uid, rng),
+                                      headers={"X-Telegram-Bot-Api-Secret-Token": SECRET}).status_code
+                if status != 200 or not api.wait_for(uid, method, expected, args.timeout):
+                    with lock:
+                        failures.append({"user": uid, "step": name, "status": status})
+                    return
+                with lock:
+                    latencies[name].append(time.perf_counter() - started)
+            with lock:
+                flows.append(time.perf_counter() - flow_started)
+
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(args.users)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    webhook.shutdown()
+    updater.dispatcher.stop()
+    api.stop()
+    replay.stop()
+
+    updates = sum(len(samples) for samples in latencies.values())
+    results = {f"webhook/{name}": summarize(samples or [0.0]) for name, samples in latencies.items()}
+    results["webhook/conversation"] = summarize(flows or [0.0], users=args.users, failures=len(failures),
+                                                updates_per_second=round(updates / elapsed, 2),
+                                                upstream_requests=dict(replay.requests))
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'args': vars(args),
+            'wrong_secret_status': rejected,
+            'failures': failures[:20],
+        },
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,17 @@
+import asyncio
 import discord
 from discord.ext import commands
 from datetime import datetime
+import services.diets as diets
 import services.menu_query as menu_query
+import services.notifications as notifications
+import services.prefetch as prefetch
+import services.search as search
 import config.config as cfg
-from utils.formatter import format_menu
-from utils.translator import translate_text
+from services.user_state import get_user_state_store
+from utils import metrics
+from utils.formatter import format_menu, format_as_of
+from utils.translator import translate_text, translate_many, translations_version
 import logging
 
 # Set up logging to print to console
@@ -18,15 +25,23 @@ intents.reactions = True  # Make sure reaction intents are enabled
 
 bot = commands.Bot(command_prefix='!', intents=intents)
 
-user_state = {}
-
 # Constants for the conversation flow
-HALL, PERIOD = range(2)
+HALL, PERIOD, LANGUAGE = range(3)
+
+# Namespace and default language of this bot's records in the shared user state store
+BOT = 'discord'
+DEFAULT_LANGUAGE = 'English'
+
+def _user(user_id):
+    return get_user_state_store().get(BOT, user_id, DEFAULT_LANGUAGE)
+
+def _update_user(user_id, **fields):
+    return get_user_state_store().update(BOT, user_id, DEFAULT_LANGUAGE, **fields)
 
 async def display_halls(user_id, ctx):
     halls = cfg.load_halls()
     hall_buttons = [f"{i+1}. {hall['name']}" for i, hall in enumerate(halls)]
-    hall_message = translate_text("Where would you like to eat today?", user_state[user_id]['language'])
+    hall_message = translate_text("Where would you like to eat today?", _user(user_id).language)
     
     # Present the halls as a message, reacting with numbers
     message = await ctx.send(hall_message + "\n" + "\n".join(hall_buttons))
@@ -35,15 +50,12 @@ async def display_halls(user_id, ctx):
     for i in range(len(halls)):
         await message.add_reaction(f"{i+1}\u20e3")  # Adds number emojis
 
-    # Store the hall options in user_state
-    user_state[user_id]['halls'] = halls
-    user_state[user_id]['conversation_stage'] = HALL
-    user_state[user_id]['message_id'] = message.id
+    _update_user(user_id, stage=HALL, message_id=message.id)
 
 async def display_periods(user_id, ctx):
     periods = cfg.load_periods()
     period_buttons = [f"{i+1}. {period}" for i, period in enumerate(periods)]
-    period_message = translate_text("When would you like to eat?", user_state[user_id]['language'])
+    period_message = translate_text("When would you like to eat?", _user(user_id).language)
     
     message = await ctx.send(period_message + "\n" + "\n".join(period_buttons))
     logging.info(f"Sent period selection message: {message.content}")
@@ -51,72 +63,109 @@ async def display_periods(user_id, ctx):
     for i in range(len(periods)):
         await message.add_reaction(f"{i+1}\u20e3")
 
-    # Store the periods in user_state
-    user_state[user_id]['periods'] = periods
-    user_state[user_id]['conversation_stage'] = PERIOD
-    user_state[user_id]['message_id'] = message.id
+    _update_user(user_id, stage=PERIOD, message_id=message.id)
 
 async def process_hall_choice(user_id, ctx, hall_index):
     logging.info(f"Processing hall choice: index {hall_index}")
-    selected_halls = user_state.get(user_id, {}).get('halls')
+    halls = cfg.load_halls()
 
-    if not selected_halls or len(selected_halls) <= hall_index:
-        logging.error(f"Invalid hall choice or user state is missing for {user_id}")
+    if not 0 <= hall_index < len(halls):
+        logging.error(f"Invalid hall choice for {user_id}")
         await ctx.send("An error occurred, please try again by starting a new conversation using `!start`.")
         return
 
-    selected_hall = selected_halls[hall_index]
-    user_state[user_id]['hall_pid'] = selected_hall['pid']
-    user_state[user_id]['hall_name'] = selected_hall['name']
+    _update_user(user_id, hall_pid=halls[hall_index]['pid'])
     await display_periods(user_id, ctx)
 
 async def process_period_choice(user_id, ctx, period_index):
     logging.info(f"Processing period choice: index {period_index}")
-    selected_periods = user_state.get(user_id, {}).get('periods')
-    
-    if not selected_periods or len(selected_periods) <= period_index:
-        logging.error(f"Invalid period choice or user state is missing for {user_id}")
+    periods = cfg.load_periods()
+
+    if not 0 <= period_index < len(periods):
+        logging.error(f"Invalid period choice for {user_id}")
         await ctx.send("An error occurred, please try again by starting a new conversation using `!start`.")
         return
 
-    selected_period = selected_periods[period_index]
-    user_state[user_id]['period'] = selected_period
+    selected_period = periods[period_index]
+    user = _update_user(user_id, stage=None, period=selected_period)
 
     today_date = datetime.now().strftime('%Y-%m-%d')
-    language = user_state[user_id].get('language', 'English')
+    language = user.language
     searching_message = translate_text("Searching...", language)
     await ctx.send(searching_message)
 
-    menu = menu_query.fetch_menu_data(date=today_date, meal=user_state[user_id]['period'], pid=user_state[user_id]['hall_pid'])
-    
+    hall_pid = user.hall_pid
+    hall_name = cfg.get_registry().hall_name(hall_pid)
+    try:
+        with metrics.timed("fetch_menu", bot=BOT):
+            menu, as_of = await menu_query.fetch_menu_async(date=today_date, meal=selected_period, unitOid=hall_pid)
+    except Exception as e:
+        logging.warning(f"Menu fetch failed for {hall_name} on {today_date}: {e}")
+        menu, as_of = None, None
+
     if not menu:
-        logging.warning(f"No menu data found for {user_state[user_id]['hall_name']} on {today_date}")
+        logging.warning(f"No menu data found for {hall_name} on {today_date}")
         no_menu_message = translate_text("Sorry, no menu data available. This hall may not be open during this period.", language)
         await ctx.send(no_menu_message)
         return
 
-    translated_menu = {translate_text(category, language): [translate_text(item['dish'], language) for item in items]
-                       for category, items in menu.items()}
-    
-    formatted_menu = format_menu(translated_menu)
-    title = f"{today_date} - {user_state[user_id]['hall_name']} - {user_state[user_id]['period']}"
-    
-    logging.info(f"Displaying menu for {user_state[user_id]['hall_name']} on {today_date}")
-    await ctx.send(f"{title}\n{formatted_menu}")
-    user_state[user_id]['conversation_stage'] = None
+    diet = diets.DietFilter.from_text(user.diet) if user.diet else None
+    notice = None
+    if diet is not None:
+        filtered = menu_query.filter_menu(today_date, selected_period, hall_pid, menu, diet)
+        if filtered is None:
+            diet, notice = None, "Dietary information is not available for this menu, showing all dishes."
+        elif not filtered:
+            no_match_message = translate_text("No dishes on this menu match your filter:", language)
+            await ctx.send(f"{no_match_message} {diet.text}")
+            return
+        else:
+            menu = filtered
+
+    text = menu_query.rendered_menus.get_or_render(
+        ('discord', hall_pid, today_date, selected_period, language, translations_version(language),
+         diet.text if diet else None),
+        menu,
+        lambda: _render_menu(menu, today_date, hall_name, selected_period, language, diet)
+    )
+
+    if notice is not None:
+        text += f"\n_{translate_text(notice, language)}_"
+
+    if as_of is not None:
+        text += f"\n_{translate_text('Live menu is unavailable right now. Showing the menu as of', language)} {format_as_of(as_of)}_"
+
+    logging.info(f"Displaying menu for {hall_name} on {today_date}")
+    with metrics.timed("discord_send"):
+        await ctx.send(text)
+
+def _render_menu(menu, date, hall_name, period, language, diet=None):
+    with metrics.timed("translate", language=language):
+        translated_menu = dict(zip(translate_many(menu.keys(), language),
+                                   (translate_many(items, language) for items in menu.values())))
+    with metrics.timed("format_menu"):
+        title = f"{date} - {hall_name} - {period}"
+        if diet is not None:
+            title += f" - {diet.text}"
+        return f"{title}\n{format_menu(translated_menu)}"
+
+def _unknown_tags_message(unknown, known, language):
+    message = f"{translate_text('These dietary tags are not known and were ignored:', language)} {', '.join(unknown)}"
+    if known:
+        message += f"\n{translate_text('Known tags:', language)} {', '.join(sorted(known))}"
+    return message
 
 @bot.command(name='start')
-async def start(ctx):
+async def start(ctx, *, diet_filter: str = ''):
+    """ !start [filter]: pick a hall and period; e.g. !start vegan, no peanuts only lists matching dishes. """
     user_id = ctx.author.id
-    # Ensure user_state is initialized
-    if user_id not in user_state:
-        user_state[user_id] = {
-            'conversation_stage': None,
-            'language': 'English'
-        }
-    
+    known = menu_query.known_tags()
+    diet, unknown = diets.parse_diet_filter(diet_filter, known)
+    user = _update_user(user_id, diet=diet.text if diet else None)
     welcome_message = "Welcome to the NCSU Dining Bot! This bot helps you check the daily menu for various dining halls in NCSU campus."
-    await ctx.send(translate_text(welcome_message, user_state[user_id]['language']))
+    await ctx.send(translate_text(welcome_message, user.language))
+    if unknown:
+        await ctx.send(_unknown_tags_message(unknown, known, user.language))
 
     await display_halls(user_id, ctx)
 
@@ -125,15 +174,59 @@ async def language_command(ctx):
     languages = cfg.load_languages()
     language_buttons = [f"{i+1}. {lang}" for i, lang in enumerate(languages)]
     
-    language_message = translate_text("Select your language:", user_state[ctx.author.id]['language'])
+    language_message = translate_text("Select your language:", _user(ctx.author.id).language)
     message = await ctx.send(language_message + "\n" + "\n".join(language_buttons))
     logging.info(f"Sent language selection message: {message.content}")
     
     for i in range(len(languages)):
         await message.add_reaction(f"{i+1}\u20e3")
     
-    user_state[ctx.author.id]['languages'] = languages
-    user_state[ctx.author.id]['message_id'] = message.id
+    _update_user(ctx.author.id, stage=LANGUAGE, message_id=message.id)
+
+@bot.command(name='find')
+async def find_command(ctx, *args):
+    """!find <dish>: search every indexed hall and period without scraping."""
+    language = _user(ctx.author.id).language
+    query = ' '.join(args)
+    if not query:
+        await ctx.send(translate_text("Usage: !find <dish>", language))
+        return
+    results = search.find_dishes(query)
+    if not results:
+        await ctx.send(translate_text("No matching dishes found.", language))
+        return
+    # Discord rejects messages over 2000 characters
+    await ctx.send('\n'.join(search.format_results(results, language))[:2000])
+
+@bot.command(name='notify')
+async def notify_command(ctx, *args):
+    """!notify <hall> <meal> [keyword]: post in this channel when that menu is posted, or when a matching dish appears."""
+    language = _user(ctx.author.id).language
+    subscriptions = notifications.get_notifier().subscriptions
+    parsed = notifications.parse_subscription(list(args))
+    if parsed is None:
+        registry = cfg.get_registry()
+        current = [f"{registry.hall_name(unit)} {meal} {keyword}".strip()
+                   for unit, meal, keyword in subscriptions.for_chat(BOT, ctx.channel.id)]
+        usage = translate_text("Usage: !notify <hall> <meal> [keyword]. Your subscriptions:", language)
+        await ctx.send('\n'.join([usage] + (current or ['-'])))
+        return
+    hall, meal, keyword = parsed
+    subscriptions.add(BOT, ctx.channel.id, hall['pid'], meal, keyword, language)
+    await ctx.send(translate_text("Subscribed. Use !unnotify to stop notifications.", language))
+
+@bot.command(name='unnotify')
+async def unnotify_command(ctx):
+    notifications.get_notifier().subscriptions.remove_all(BOT, ctx.channel.id)
+    await ctx.send(translate_text("Notifications stopped.", _user(ctx.author.id).language))
+
+def _send_from_thread(channel_id, text):
+    """ Notifier sender: runs on the notifier thread, so hop onto the bot's event loop. """
+    channel = bot.get_channel(channel_id)
+    if channel is None:
+        logging.warning(f"Notification channel {channel_id} not found")
+        return
+    asyncio.run_coroutine_threadsafe(channel.send(text), bot.loop).result(timeout=30)
 
 @bot.event
 async def on_raw_reaction_add(payload):
@@ -151,18 +244,14 @@ async def on_raw_reaction_add(payload):
 
 
 
-    # Ensure the user state is initialized
     user_id = payload.user_id
-    if user_id not in user_state:
-        logging.warning(f"User state missing for {user_id}, initializing state.")
-        user_state[user_id] = {'conversation_stage': None, 'language': 'English'}  # Initialize default state
-
-    if 'conversation_stage' not in user_state[user_id]:
+    user = _user(user_id)
+    if user.stage is None:
         logging.warning(f"User {user_id} is not in a conversation")
         return  # Ignore if the user is not in a conversation
 
     # Make sure the reaction is on the correct message
-    if payload.message_id != user_state[user_id]['message_id']:
+    if payload.message_id != user.message_id:
         logging.warning(f"Reaction on the wrong message by user {user_id}")
         return  # Ignore reactions on other messages
 
@@ -177,19 +266,29 @@ async def on_raw_reaction_add(payload):
     ctx = await bot.get_context(message)
 
     # Process the choice based on the current conversation stage
-    if user_state[user_id]['conversation_stage'] == HALL:
+    if user.stage == HALL:
         await process_hall_choice(user_id, ctx, choice)
-    elif user_state[user_id]['conversation_stage'] == PERIOD:
+    elif user.stage == PERIOD:
         await process_period_choice(user_id, ctx, choice)
-    elif 'languages' in user_state[user_id]:
-        selected_language = user_state[user_id]['languages'][choice]
-        user_state[user_id]['language'] = selected_language
+    elif user.stage == LANGUAGE:
+        languages = cfg.load_languages()
+        if not 0 <= choice < len(languages):
+            logging.error(f"Invalid language choice for {user_id}")
+            return
+        selected_language = languages[choice]
+        _update_user(user_id, stage=None, language=selected_language)
         logging.info(f"Language set to {selected_language} for user {user_id}")
         await ctx.send(translate_text(f"Language set. You can now use `!start` to begin.", selected_language))
 
 def start_discord_bot():
     discord_token = cfg.load_discord_config()['discord_token']
+    cfg.reload_registry()
+    cfg.install_reload_signal()
     logging.info("Starting the Discord bot...")
+    metrics.start_metrics_server(**cfg.load_metrics_config())
+    notifications.get_notifier().register_sender(BOT, _send_from_thread)
+    menu_query.warm_from_store()
+    prefetch.start_scheduler()
     bot.run(discord_token)
 
 if __name__ == '__main__':
@@ -1,72 +1,119 @@
+import signal
+import threading
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import TelegramError
 from telegram.ext import Updater, CommandHandler, CallbackContext, ConversationHandler, CallbackQueryHandler
+import services.diets as diets
 import services.menu_query as menu_query
+import services.notifications as notifications
+import services.prefetch as prefetch
+import services.search as search
 import config.config as cfg
-from utils.formatter import format_menu
-from utils.translator import translate_text
+from services.user_state import get_user_state_store
+from utils import metrics
+from utils.chat_executor import ChatExecutor
+from utils.formatter import format_menu, format_as_of
+from utils.translator import translate_text, translate_many, translations_version
 
 # Define stages of conversation
 HALL, PERIOD = range(2)
 
+# Worker pool for slow handlers, created in start_telegram_bot()
+handler_pool: ChatExecutor = None
+
+# Namespace and default language of this bot's records in the shared user state store
+BOT = 'telegram'
+DEFAULT_LANGUAGE = 'Chinese'
+
+def _user(user_id):
+    return get_user_state_store().get(BOT, user_id, DEFAULT_LANGUAGE)
+
+def _update_user(user_id, **fields):
+    return get_user_state_store().update(BOT, user_id, DEFAULT_LANGUAGE, **fields)
+
+_keyboard_cache = {}
+
+def _keyboards():
+    """ Inline keyboards built once per config registry version. """
+    registry = cfg.get_registry()
+    if _keyboard_cache.get('version') != registry.version:
+        _keyboard_cache.update({
+            'version': registry.version,
+            'halls': InlineKeyboardMarkup([[InlineKeyboardButton(hall['name'], callback_data=hall['pid'])]
+                                           for hall in registry.halls]),
+            'periods': InlineKeyboardMarkup([[InlineKeyboardButton(period, callback_data=period)]
+                                             for period in registry.periods]),
+            'languages': InlineKeyboardMarkup([[InlineKeyboardButton(lang, callback_data='lang_' + lang)]
+                                               for lang in registry.languages]),
+        })
+    return _keyboard_cache
+
 def start(update: Update, context: CallbackContext):
+    """ /start [filter]: pick a hall and period; e.g. /start vegan, no peanuts only lists matching dishes. """
 
     if context.chat_data.get('conversation_state') is not None:
         context.chat_data['conversation_state'] = None
 
-    user_id = update.effective_user.id
-    if user_id in context.bot_data and 'language' in context.bot_data[user_id]:
-        language = context.bot_data[user_id]['language']
-    else:
-        language = 'Chinese'
-        context.bot_data[user_id] = {'language': language}
+    known = menu_query.known_tags()
+    diet, unknown = diets.parse_diet_filter(context.args or [], known)
+    language = _update_user(update.effective_user.id, diet=diet.text if diet else None).language
     welcome_message = "Welcome to the NCSU Dining Bot! This bot helps you check the daily menu for various dining halls in NCSU campus."
     update.message.reply_text(translate_text(welcome_message, language))
+    if unknown:
+        update.message.reply_text(_unknown_tags_message(unknown, known, language))
     return display_halls(update, context)
 
+def _unknown_tags_message(unknown, known, language):
+    message = f"{translate_text('These dietary tags are not known and were ignored:', language)} {', '.join(unknown)}"
+    if known:
+        message += f"\n{translate_text('Known tags:', language)} {', '.join(sorted(known))}"
+    return message
+
 def display_halls(update: Update, context: CallbackContext):
-    halls = cfg.load_halls()
-    keyboard = []
-    for hall in halls:
-        keyboard.append([InlineKeyboardButton(hall['name'], callback_data=hall['pid'])])
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    ask_hall_message = translate_text('Where would you like to eat today?', context.bot_data[update.effective_user.id]['language'])
-    update.effective_message.reply_text(ask_hall_message, reply_markup=reply_markup)
+    reply_markup = _keyboards()['halls']
+    ask_hall_message = translate_text('Where would you like to eat today?', _user(update.effective_user.id).language)
+    message = update.effective_message.reply_text(ask_hall_message, reply_markup=reply_markup)
+    _update_user(update.effective_user.id, stage=HALL, message_id=message.message_id)
     return HALL
 
 def hall_choice(update: Update, context: CallbackContext):
     query = update.callback_query
     query.answer()
-    # Store both hall name and PID in user_data
-    selected_hall = next((hall for hall in cfg.load_halls() if hall['pid'] == query.data), None)
-    context.user_data['hall_pid'] = query.data
-    context.user_data['hall_name'] = selected_hall['name'] if selected_hall else 'Unknown Hall'
-    keyboard = []
-    for period in cfg.load_periods():
-        keyboard.append([InlineKeyboardButton(period, callback_data=period) ])
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    ask_period_message = translate_text('When would you like to eat?', context.bot_data[update.effective_user.id]['language'])
+    user = _update_user(update.effective_user.id, stage=PERIOD, hall_pid=query.data)
+    reply_markup = _keyboards()['periods']
+    ask_period_message = translate_text('When would you like to eat?', user.language)
     query.edit_message_text(text=ask_period_message, reply_markup=reply_markup)
     return PERIOD
 
 def period_choice(update: Update, context: CallbackContext):
     query = update.callback_query
     query.answer()
-    context.user_data['period'] = query.data
+    user = _update_user(update.effective_user.id, stage=None, period=query.data)
+    # The menu lookup can block on upstream; hand it to the worker pool so the
+    # dispatcher keeps serving other chats. Replies within a chat stay in order.
+    # The job gets its own copy of the choices: a later /start or hall tap,
+    # handled here on the dispatcher, must not change a reply still queued.
+    handler_pool.submit(update.effective_chat.id, _period_choice, query,
+                        user.hall_pid, user.period, user.language, user.diet)
+    return ConversationHandler.END
+
+def _period_choice(query, hall_pid, period, language, diet_text):
+    hall_name = cfg.get_registry().hall_name(hall_pid)
     now = datetime.now(ZoneInfo("America/New_York"))
     query_date = now + timedelta(days=1) if now.hour >= 21 else now
     query_date_str = query_date.strftime('%Y-%m-%d')
-    language = context.bot_data.get(update.effective_user.id, {}).get('language', 'Chinese')
     searching_message = translate_text("Searching...", language)
     query.edit_message_text(text=searching_message)
-    menu = None
+    menu, as_of = None, None
     try:
-        menu = menu_query.fetch_menu_data(
-            date=query_date_str,
-            meal=context.user_data['period'],
-            unitOid=context.user_data['hall_pid']
-        )
+        with metrics.timed("fetch_menu", bot=BOT):
+            menu, as_of = menu_query.fetch_menu(
+                date=query_date_str,
+                meal=period,
+                unitOid=hall_pid
+            )
     except Exception:
         menu = None
     if not menu:
@@ -75,26 +122,45 @@ def period_choice(update: Update, context: CallbackContext):
             language
         )
         query.edit_message_text(text=invalid_message)
-        return ConversationHandler.END
-    translated_menu = {translate_text(category, language): [translate_text(item, language) for item in items]
-                       for category, items in menu.items()}
-    formatted_menu = format_menu(translated_menu)
-    title = f"*Date:* {query_date_str}\n*Hall:* {context.user_data['hall_name']}\n*Period:* {context.user_data['period']}\n"
-    text = f"{formatted_menu}"
-    query.edit_message_text(text=title + '\n' + text, parse_mode="markdown")
-    return ConversationHandler.END
+        return
+    diet = diets.DietFilter.from_text(diet_text) if diet_text else None
+    notice = None
+    if diet is not None:
+        filtered = menu_query.filter_menu(query_date_str, period, hall_pid, menu, diet)
+        if filtered is None:
+            diet, notice = None, "Dietary information is not available for this menu, showing all dishes."
+        elif not filtered:
+            no_match_message = translate_text("No dishes on this menu match your filter:", language)
+            query.edit_message_text(text=f"{no_match_message} {diet.text}")
+            return
+        else:
+            menu = filtered
+    text = menu_query.rendered_menus.get_or_render(
+        (BOT, hall_pid, query_date_str, period, language, translations_version(language),
+         diet.text if diet else None),
+        menu,
+        lambda: _render_menu(menu, query_date_str, hall_name, period, language, diet)
+    )
+    if notice is not None:
+        text += f"\n_{translate_text(notice, language)}_"
+    if as_of is not None:
+        text += f"\n_{translate_text('Live menu is unavailable right now. Showing the menu as of', language)} {format_as_of(as_of)}_"
+    with metrics.timed("telegram_edit"):
+        query.edit_message_text(text=text, parse_mode="markdown")
+
+def _render_menu(menu, date, hall_name, period, language, diet=None):
+    with metrics.timed("translate", language=language):
+        translated_menu = dict(zip(translate_many(menu.keys(), language),
+                                   (translate_many(items, language) for items in menu.values())))
+    with metrics.timed("format_menu"):
+        title = f"*Date:* {date}\n*Hall:* {hall_name}\n*Period:* {period}\n"
+        if diet is not None:
+            title += f"*Filter:* {diet.text}\n"
+        return title + '\n' + format_menu(translated_menu)
 
 def language_command(update: Update, context: CallbackContext):
-    languages = cfg.load_languages()
-    keyboard = []
-    for lang in languages:
-        keyboard.append([InlineKeyboardButton(lang, callback_data='lang_' + lang)])
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    user_id = update.effective_user.id
-    if not (user_id in context.bot_data and 'language' in context.bot_data[user_id]):
-        context.bot_data[user_id] = {'language': 'Chinese'}
-    language_message = translate_text("Select your language:", context.bot_data[update.effective_user.id]['language'])
+    reply_markup = _keyboards()['languages']
+    language_message = translate_text("Select your language:", _user(update.effective_user.id).language)
     update.message.reply_text(language_message, reply_markup=reply_markup)
 
 
@@ -104,19 +170,125 @@ def set_language(update: Update, context: CallbackContext):
         return  # Ignore if the callback data doesn't indicate a language choice
     query.answer()
     language = query.data.split('_')[1]  # Extract the language from callback data
-    user_id = query.from_user.id
-    context.bot_data[user_id] = {'language': language}
+    _update_user(query.from_user.id, language=language)
     set_language_message = translate_text("Language set. You may use /start to search for menu today.", language)
     query.edit_message_text(text=set_language_message)
 
 
+# Telegram rejects messages longer than this
+MAX_MESSAGE_LENGTH = 4096
+
+def _split_message(text, limit=MAX_MESSAGE_LENGTH):
+    """ Split text into chunks of at most limit characters, at line boundaries where possible. """
+    chunks, chunk = [], ''
+    for line in text.split('\n'):
+        while len(line) > limit:  # a single overlong line has to be cut
+            if chunk:
+                chunks.append(chunk)
+                chunk = ''
+            chunks.append(line[:limit])
+            line = line[limit:]
+        if chunk and len(chunk) + len(line) + 1 > limit:
+            chunks.append(chunk)
+            chunk = line
+        else:
+            chunk = f"{chunk}\n{line}" if chunk else line
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+def week_command(update: Update, context: CallbackContext):
+    handler_pool.submit(update.effective_chat.id, _week, update, context)
+
+def _week(update: Update, context: CallbackContext):
+    """ /week <hall>: every menu the hall publishes for the next 7 days, one message per day. """
+    language = _user(update.effective_user.id).language
+    registry = cfg.get_registry()
+    hall = registry.find_hall(' '.join(context.args))
+    if hall is None:
+        usage = translate_text("Usage: /week <hall>. Available halls:", language)
+        update.message.reply_text(f"{usage} {', '.join(h['name'] for h in registry.halls)}")
+        return
+
+    update.message.reply_text(translate_text("Searching...", language))
+    today = datetime.now(menu_query.TIMEZONE).date()
+    days = {}
+    for _, date, meal, menu in menu_query.iter_menus(
+            today.isoformat(), (today + timedelta(days=6)).isoformat(), [hall['pid']]):
+        if menu:
+            # Spelled like the period buttons, so titles and render cache entries match /start's
+            days.setdefault(date, {})[registry.period_name(meal)] = menu
+    if not days:
+        update.message.reply_text(translate_text("Sorry, no menu data available.", language))
+        return
+
+    period_order = {period: i for i, period in enumerate(registry.periods)}
+    for date in sorted(days):
+        meals = sorted(days[date], key=lambda meal: (period_order.get(meal, len(period_order)), meal))
+        message = ''
+        for meal in meals:
+            text = menu_query.rendered_menus.get_or_render(
+                (BOT, hall['pid'], date, meal, language, translations_version(language), None),
+                days[date][meal],
+                lambda: _render_menu(days[date][meal], date, hall['name'], meal, language)
+            )
+            for chunk in _split_message(text):
+                if message and len(message) + len(chunk) + 1 > MAX_MESSAGE_LENGTH:
+                    update.message.reply_text(message, parse_mode="markdown")
+                    message = ''
+                message = f"{message}\n{chunk}" if message else chunk
+        update.message.reply_text(message, parse_mode="markdown")
+
+def notify_command(update: Update, context: CallbackContext):
+    """ /notify <hall> <meal> [keyword]: push a message when that menu is posted, or when a matching dish appears. """
+    language = _user(update.effective_user.id).language
+    subscriptions = notifications.get_notifier().subscriptions
+    chat_id = update.effective_chat.id
+    parsed = notifications.parse_subscription(context.args)
+    if parsed is None:
+        registry = cfg.get_registry()
+        current = [f"{registry.hall_name(unit)} {meal} {keyword}".strip()
+                   for unit, meal, keyword in subscriptions.for_chat(BOT, chat_id)]
+        usage = translate_text("Usage: /notify <hall> <meal> [keyword]. Your subscriptions:", language)
+        update.message.reply_text('\n'.join([usage] + (current or ['-'])))
+        return
+    hall, meal, keyword = parsed
+    subscriptions.add(BOT, chat_id, hall['pid'], meal, keyword, language)
+    update.message.reply_text(translate_text("Subscribed. Use /unnotify to stop notifications.", language))
+
+def unnotify_command(update: Update, context: CallbackContext):
+    language = _user(update.effective_user.id).language
+    notifications.get_notifier().subscriptions.remove_all(BOT, update.effective_chat.id)
+    update.message.reply_text(translate_text("Notifications stopped.", language))
+
+def find_command(update: Update, context: CallbackContext):
+    """ /find <dish>: search every indexed hall and period without scraping. """
+    language = _user(update.effective_user.id).language
+    query = ' '.join(context.args)
+    if not query:
+        update.message.reply_text(translate_text("Usage: /find <dish>", language))
+        return
+    results = search.find_dishes(query)
+    if not results:
+        update.message.reply_text(translate_text("No matching dishes found.", language))
+        return
+    update.message.reply_text('\n'.join(search.format_results(results, language))[:MAX_MESSAGE_LENGTH])
+
 def cancel_command(update: Update, context: CallbackContext):
     return ConversationHandler.END
 
-def start_telegram_bot():
-    updater = Updater(cfg.load_tg_config()['telegram_token'], use_context=True)
+def create_updater(tg_config) -> Updater:
+    """ Build the updater with every handler registered; nothing is started yet. """
+    global handler_pool
+    handler_pool = ChatExecutor(workers=tg_config['workers'], name="tg-handler")
+    metrics.register_gauge("telegram_handler_queue_depth", handler_pool.queue_depth)
+    updater = Updater(tg_config['telegram_token'], base_url=tg_config['api_url'], use_context=True)
     dispatcher = updater.dispatcher
     dispatcher.add_handler(CommandHandler('language', language_command))
+    dispatcher.add_handler(CommandHandler('week', week_command))
+    dispatcher.add_handler(CommandHandler('find', find_command))
+    dispatcher.add_handler(CommandHandler('notify', notify_command))
+    dispatcher.add_handler(CommandHandler('unnotify', unnotify_command))
     dispatcher.add_handler(CallbackQueryHandler(set_language, pattern='^lang_'))
 
 
@@ -130,6 +302,65 @@ def start_telegram_bot():
         allow_reentry=True  # Allow re-entering the same state
     )
     dispatcher.add_handler(conv_handler)
+    return updater
+
+def run_webhook(updater: Updater, tg_config) -> bool:
+    """
+    Serve updates through the built-in webhook listener until SIGINT/SIGTERM.
+    Returns False, without blocking, when the listener cannot bind or
+    Telegram refuses the webhook, so the caller can fall back to polling.
+    """
+    # webhook mode only; polling never loads http.server
+    from bots.telegram_webhook import WebhookServer, derive_secret
+    secret = tg_config['webhook_secret'] or derive_secret(tg_config['telegram_token'])
+    try:
+        server = WebhookServer(updater.dispatcher, secret, tg_config['webhook_listen'], tg_config['webhook_port'],
+                               tg_config['webhook_path'], tg_config['webhook_max_connections'],
+                               tg_config['webhook_cert'], tg_config['webhook_key'])
+    except OSError as e:
+        print(f"[WARN] webhook listener failed to start: {e}")
+        return False
+    try:
+        # Uploaded like python-telegram-bot's own webhook does, so self-signed certificates work
+        certificate = open(tg_config['webhook_cert'], 'rb') if tg_config['webhook_cert'] else None
+        try:
+            updater.bot.set_webhook(
+                url=f"{tg_config['webhook_url'].rstrip('/')}/{tg_config['webhook_path'].strip('/')}",
+                certificate=certificate,
+                max_connections=tg_config['webhook_max_connections'],
+                api_kwargs={'secret_token': secret},
+            )
+        finally:
+            if certificate is not None:
+                certificate.close()
+    except TelegramError as e:
+        print(f"[WARN] setWebhook failed: {e}")
+        server.close()
+        return False
+
+    threading.Thread(target=updater.dispatcher.start, name="tg-dispatcher", daemon=True).start()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: threading.Thread(target=server.shutdown).start())
+    server.serve_forever()
+    updater.dispatcher.stop()
+    handler_pool.shutdown()
+    return True
+
+def start_telegram_bot():
+    tg_config = cfg.load_tg_config()
+    cfg.reload_registry()
+    cfg.install_reload_signal()
+    metrics.start_metrics_server(**cfg.load_metrics_config())
+    updater = create_updater(tg_config)
+    notifications.get_notifier().register_sender(
+        BOT, lambda chat_id, text: updater.bot.send_message(chat_id=chat_id, text=text))
+    menu_query.warm_from_store()
+    prefetch.start_scheduler()
+    if tg_config['mode'] == 'webhook':
+        if tg_config['webhook_url'] and run_webhook(updater, tg_config):
+            return
+        print("[WARN] webhook mode unavailable, falling back to long polling")
+    # start_polling removes any webhook left registered with Telegram
     updater.start_polling()
     updater.idle()
 
@@ -0,0 +1,114 @@
+"""
+bots/telegram_webhook.py
+
+Built-in HTTP listener for Telegram webhook updates.
+
+Telegram POSTs every update as JSON to ``/<path>`` with the secret given to
+setWebhook in the X-Telegram-Bot-Api-Secret-Token header. Requests without
+the right secret are rejected; accepted updates are put on the dispatcher's
+update queue and answered with 200 straight away, so handlers never hold up
+Telegram's connection. At most ``max_connections`` requests are handled at
+once; extra ones get 503 and are retried by Telegram.
+
+Given a certificate and key the listener speaks HTTPS itself; otherwise it
+is plain HTTP and expects a TLS-terminating reverse proxy in front of it.
+"""
+
+import hashlib
+import hmac
+import json
+import ssl
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from telegram import Update
+from utils import metrics
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+# Updates are small; anything bigger is not from Telegram
+MAX_BODY_BYTES = 1 << 20
+
+
+def derive_secret(bot_token: str) -> str:
+    """Webhook secret derived from the bot token: stable across restarts and replicas, useless without the token."""
+    return hmac.new(bot_token.encode(), b"wolfbite telegram webhook", hashlib.sha256).hexdigest()
+
+
+class WebhookServer:
+
+    def __init__(self, dispatcher, secret_token: str, listen: str = "0.0.0.0", port: int = 8443,
+                 path: str = "telegram", max_connections: int = 40, certfile: str = None, keyfile: str = None):
+        self.dispatcher = dispatcher
+        self.path = "/" + path.strip("/")
+        self._secret = secret_token.encode()
+        self._slots = threading.BoundedSemaphore(max_connections)
+
+        server = self
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status: int):
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_POST(self):
+                if not server._slots.acquire(blocking=False):
+                    metrics.inc("telegram_webhook_requests_total", status="503")
+                    self._reply(503)
+                    return
+                try:
+                    status = server._accept(self)
+                finally:
+                    server._slots.release()
+                metrics.inc("telegram_webhook_requests_total", status=str(status))
+                self._reply(status)
+
+        self._httpd = ThreadingHTTPServer((listen, port), Handler)
+        self._httpd.daemon_threads = True
+        if certfile:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            try:
+                context.load_cert_chain(certfile, keyfile)
+            except OSError:  # ssl.SSLError included
+                self._httpd.server_close()
+                raise
+            # Handshakes run on the request threads, so a slow client cannot stall accept()
+            self._httpd.socket = context.wrap_socket(self._httpd.socket, server_side=True,
+                                                     do_handshake_on_connect=False)
+
+    def _accept(self, request: BaseHTTPRequestHandler) -> int:
+        if request.path.split("?")[0] != self.path:
+            return 404
+        secret = request.headers.get(SECRET_HEADER, "").encode()
+        if not hmac.compare_digest(secret, self._secret):
+            return 403
+        length = int(request.headers.get("Content-Length") or 0)
+        if not 0 < length <= MAX_BODY_BYTES:
+            return 400
+        try:
+            data = json.loads(request.rfile.read(length))
+            update = Update.de_json(data, self.dispatcher.bot)
+        except (ValueError, TypeError, KeyError):
+            return 400
+        self.dispatcher.update_queue.put(update)
+        return 200
+
+    @property
+    def port(self) -> int:
+        return self._httpd.server_address[1]
+
+    def serve_forever(self):
+        """Handle requests until shutdown(), then release the socket."""
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self.close()
+
+    def shutdown(self):
+        """Stop serve_forever; must be called from another thread."""
+        self._httpd.shutdown()
+
+    def close(self):
+        self._httpd.server_close()
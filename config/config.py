@@ -1,10 +1,32 @@
 import os
 import json
+import signal
+import threading
+import time
+from types import MappingProxyType
 
 def load_tg_config():
     """ Load token and other configurations from environment variables or secure storage. """
     return {
-        'telegram_token': os.getenv('TELEGRAM_TOKEN')
+        'telegram_token': os.getenv('TELEGRAM_TOKEN'),
+        # Threads running slow handlers (menu lookups); per-chat order is kept
+        'workers': int(os.getenv('TELEGRAM_WORKERS', '8')),
+        # Bot API base URL the token is appended to, e.g. http://host/bot; None means api.telegram.org
+        'api_url': os.getenv('TELEGRAM_API_URL') or None,
+        # 'webhook' needs a public webhook_url; polling is used otherwise and if the webhook cannot be set up
+        'mode': os.getenv('TELEGRAM_MODE', 'polling'),
+        'webhook_url': os.getenv('TELEGRAM_WEBHOOK_URL'),
+        'webhook_listen': os.getenv('TELEGRAM_WEBHOOK_LISTEN', '0.0.0.0'),
+        'webhook_port': int(os.getenv('TELEGRAM_WEBHOOK_PORT', '8443')),
+        'webhook_path': os.getenv('TELEGRAM_WEBHOOK_PATH', 'telegram'),
+        # Telegram echoes this in X-Telegram-Bot-Api-Secret-Token; derived from the token when unset,
+        # so every replica and restart registers and expects the same one
+        'webhook_secret': os.getenv('TELEGRAM_WEBHOOK_SECRET'),
+        # PEM certificate and key to serve HTTPS directly; without them put a TLS-terminating
+        # reverse proxy in front of the listener, since Telegram only delivers to https URLs
+        'webhook_cert': os.getenv('TELEGRAM_WEBHOOK_CERT'),
+        'webhook_key': os.getenv('TELEGRAM_WEBHOOK_KEY'),
+        'webhook_max_connections': int(os.getenv('TELEGRAM_WEBHOOK_MAX_CONNECTIONS', '40'))
     }
 
 def load_discord_config():
@@ -13,17 +35,232 @@ def load_discord_config():
         'discord_token': os.getenv('DISCORD_TOKEN')
     }
 
+def load_netnutrition_config():
+    """ Load NetNutrition client settings from environment variables. """
+    return {
+        'base_url': os.getenv('NETNUTRITION_URL', 'https://netmenu2.cbord.com/NetNutrition/ncstate-dining'),
+        'timeout': float(os.getenv('NETNUTRITION_TIMEOUT', '10')),
+        'connect_timeout': float(os.getenv('NETNUTRITION_CONNECT_TIMEOUT', '3')),
+        'pool_size': int(os.getenv('NETNUTRITION_POOL_SIZE', '8')),
+        'max_concurrency': int(os.getenv('NETNUTRITION_MAX_CONCURRENCY', '4'))
+    }
+
+def load_resilience_config():
+    """ Load retry and circuit breaker settings for upstream calls. """
+    return {
+        'retries': int(os.getenv('UPSTREAM_RETRIES', '3')),
+        'retry_base_delay': float(os.getenv('UPSTREAM_RETRY_BASE_DELAY', '0.2')),
+        'retry_max_delay': float(os.getenv('UPSTREAM_RETRY_MAX_DELAY', '2')),
+        # No retry starts later than this many seconds after the first attempt
+        'retry_deadline': float(os.getenv('UPSTREAM_RETRY_DEADLINE', '10')),
+        'failure_threshold': int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5')),
+        'reset_timeout': float(os.getenv('CIRCUIT_RESET_TIMEOUT', '30'))
+    }
+
+def load_cache_config():
+    """ Load menu cache settings (seconds / entry count) from environment variables. """
+    return {
+        'ttl': float(os.getenv('MENU_CACHE_TTL', '1800')),
+        'stale_ttl': float(os.getenv('MENU_CACHE_STALE_TTL', '21600')),
+        'negative_ttl': float(os.getenv('MENU_CACHE_NEGATIVE_TTL', '300')),
+        'max_entries': int(os.getenv('MENU_CACHE_MAX_ENTRIES', '256'))
+    }
+
+def load_singleflight_config():
+    """ Load how long (seconds) a request waits on an identical in-flight scrape. """
+    return {
+        'timeout': float(os.getenv('SINGLEFLIGHT_TIMEOUT', '30'))
+    }
+
+def load_unit_map_cache_config():
+    """ Load settings for the per-unit date -> meal -> menuOid cache. """
+    return {
+        'ttl': float(os.getenv('UNIT_MAP_CACHE_TTL', '86400')),
+        'stale_ttl': float(os.getenv('UNIT_MAP_CACHE_STALE_TTL', '3600')),
+        'max_entries': int(os.getenv('UNIT_MAP_CACHE_MAX_ENTRIES', '32'))
+    }
+
+def load_prefetch_config():
+    """ Load the background menu warm-up schedule from environment variables. """
+    return {
+        'enabled': os.getenv('PREFETCH_ENABLED', '1') == '1',
+        'interval': float(os.getenv('PREFETCH_INTERVAL', '900')),
+        'jitter': float(os.getenv('PREFETCH_JITTER', '60')),
+        'workers': int(os.getenv('PREFETCH_WORKERS', '4')),
+        # Seconds between looks at the menu store for menus other processes scraped; 0 = never
+        'sync_interval': float(os.getenv('STORE_SYNC_INTERVAL', '0'))
+    }
+
+def load_menu_store_config():
+    """ Load the on-disk menu store location and write batching settings. """
+    return {
+        'path': os.getenv('MENU_STORE_PATH', os.path.join(os.path.dirname(__file__), '..', 'data', 'menus.sqlite3')),
+        'batch_size': int(os.getenv('MENU_STORE_BATCH_SIZE', '50')),
+        'flush_interval': float(os.getenv('MENU_STORE_FLUSH_INTERVAL', '2'))
+    }
+
+def load_user_state_config():
+    """ Load the shared per-user state store location and limits. """
+    return {
+        'path': os.getenv('USER_STATE_PATH', os.path.join(os.path.dirname(__file__), '..', 'data', 'users.sqlite3')),
+        'max_users': int(os.getenv('USER_STATE_MAX_USERS', '5000')),
+        'idle_ttl': float(os.getenv('USER_STATE_IDLE_TTL', '3600'))
+    }
+
+def load_notification_config():
+    """ Load the menu-change subscription store location and send rate limits. """
+    return {
+        'path': os.getenv('SUBSCRIPTIONS_PATH', os.path.join(os.path.dirname(__file__), '..', 'data', 'subscriptions.sqlite3')),
+        'rate_per_second': float(os.getenv('NOTIFY_RATE_PER_SECOND', '20')),
+        'batch_interval': float(os.getenv('NOTIFY_BATCH_INTERVAL', '2'))
+    }
+
+def load_metrics_config():
+    """ Load the address of the local /metrics endpoint; port 0 disables it. """
+    return {
+        'host': os.getenv('METRICS_HOST', '127.0.0.1'),
+        'port': int(os.getenv('METRICS_PORT', '9108'))
+    }
+
+def load_shared_cache_config():
+    """ Load the cross-process cache backend ('none', 'memory', 'sqlite' or 'redis') and its timings. """
+    return {
+        'backend': os.getenv('SHARED_BACKEND', 'none'),
+        # SQLite file path, or redis://host:port/db
+        'url': os.getenv('SHARED_BACKEND_URL', os.path.join(os.path.dirname(__file__), '..', 'data', 'shared.sqlite3')),
+        # Menus scraped by any process less than this many seconds ago are reused as-is
+        'fresh_for': float(os.getenv('SHARED_CACHE_FRESH_FOR', '300')),
+        'keep_for': float(os.getenv('SHARED_CACHE_KEEP_FOR', '86400')),
+        'lease_ttl': float(os.getenv('SHARED_CACHE_LEASE_TTL', '30')),
+        'wait': float(os.getenv('SHARED_CACHE_WAIT', '30'))
+    }
+
+CONFIG_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_FILES = ('halls.json', 'periods.json', 'languages.json')
+# How often (seconds) the JSON files' mtimes are re-checked for changes
+RELOAD_CHECK_INTERVAL = 5.0
+
+
+class Registry:
+    """
+    Immutable, validated snapshot of halls.json, periods.json and languages.json
+    with O(1) lookups. ``version`` changes whenever any of the files is reloaded,
+    so callers can key derived data (e.g. prebuilt keyboards) on it.
+    """
+
+    def __init__(self, halls, periods, languages, version):
+        self.halls = tuple(MappingProxyType(dict(hall)) for hall in halls)
+        self.periods = tuple(periods)
+        self.languages = tuple(languages)
+        self.version = version
+        self.halls_by_pid = MappingProxyType({hall['pid']: hall for hall in self.halls})
+        self.halls_by_name = MappingProxyType({hall['name']: hall for hall in self.halls})
+        self._halls_by_key = MappingProxyType({_lookup_key(hall['name']): hall for hall in self.halls})
+        self._periods_by_key = MappingProxyType({_lookup_key(period): period for period in self.periods})
+
+    def hall_name(self, pid, default='Unknown Hall'):
+        hall = self.halls_by_pid.get(pid)
+        return hall['name'] if hall else default
+
+    def find_hall(self, name):
+        """ Hall by pid or by name as a user types it ('clark', 'on the  oval'); None if unknown. """
+        return self.halls_by_pid.get(name.strip()) or self._halls_by_key.get(_lookup_key(name))
+
+    def period_name(self, meal):
+        """ The configured spelling of a meal period; meals not in periods.json come back title-cased. """
+        return self._periods_by_key.get(_lookup_key(meal), ' '.join(meal.split()).title())
+
+
+def _lookup_key(name):
+    return ' '.join(name.split()).casefold()
+
+
+def _validate(halls, periods, languages):
+    if not isinstance(halls, list) or not halls:
+        raise ValueError("halls.json must be a non-empty list")
+    for hall in halls:
+        if not (isinstance(hall, dict) and isinstance(hall.get('name'), str) and isinstance(hall.get('pid'), str)):
+            raise ValueError(f"halls.json: every hall needs string 'name' and 'pid', got {hall!r}")
+    for field in ('name', 'pid'):
+        if len({hall[field] for hall in halls}) != len(halls):
+            raise ValueError(f"halls.json: duplicate hall {field}")
+    for name, values in (('periods.json', periods), ('languages.json', languages)):
+        if not (isinstance(values, list) and values and all(isinstance(v, str) for v in values)):
+            raise ValueError(f"{name} must be a non-empty list of strings")
+        if len(set(values)) != len(values):
+            raise ValueError(f"{name}: duplicate entries")
+
+
+def _read_registry():
+    paths = [os.path.join(CONFIG_DIR, name) for name in CONFIG_FILES]
+    version = tuple(os.stat(path).st_mtime_ns for path in paths)
+    loaded = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as file:
+            loaded.append(json.load(file))
+    _validate(*loaded)
+    return Registry(*loaded, version=version)
+
+
+_registry = None
+_registry_checked = 0.0
+_registry_lock = threading.Lock()
+# Set by the SIGHUP handler, acted on by the next get_registry() call
+_reload_requested = False
+
+def reload_registry():
+    """
+    Re-read the config files. An invalid edit is reported and the previous
+    registry is kept; with no previous registry the error propagates.
+    """
+    global _registry, _registry_checked
+    with _registry_lock:
+        try:
+            _registry = _read_registry()
+        except (OSError, ValueError) as e:
+            if _registry is None:
+                raise
+            print(f"[WARN] keeping previous config, reload failed: {e}")
+        _registry_checked = time.monotonic()
+        return _registry
+
+def get_registry() -> Registry:
+    """ Return the loaded config registry, reloading it if a file changed on disk. """
+    global _registry_checked, _reload_requested
+    if _registry is None:
+        return reload_registry()
+    if _reload_requested:
+        _reload_requested = False
+        return reload_registry()
+    if time.monotonic() - _registry_checked >= RELOAD_CHECK_INTERVAL:
+        _registry_checked = time.monotonic()
+        try:
+            version = tuple(os.stat(os.path.join(CONFIG_DIR, name)).st_mtime_ns for name in CONFIG_FILES)
+        except OSError:
+            version = _registry.version
+        if version != _registry.version:
+            return reload_registry()
+    return _registry
+
+def _request_reload(signum, frame):
+    # Only flag it: the handler may interrupt a thread that holds _registry_lock,
+    # so reloading here could deadlock
+    global _reload_requested
+    _reload_requested = True
+
+def install_reload_signal():
+    """ Reload the registry on the next lookup after SIGHUP. Must be called from the main thread. """
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, _request_reload)
+
 def load_halls():
-    """ Load dining halls from a JSON file. """
-    with open('config/halls.json', 'r') as file:
-        return json.load(file)
+    """ Return the dining halls from the config registry. """
+    return get_registry().halls
 
 def load_periods():
-    """ Load meal periods from a JSON file. """
-    with open('config/periods.json', 'r') as file:
-        return json.load(file)
+    """ Return the meal periods from the config registry. """
+    return get_registry().periods
 
 def load_languages():
-    """ Load supported languages from a JSON file. """
-    with open('config/languages.json', 'r') as file:
-        return json.load(file)
\ No newline at end of file
+    """ Return the supported languages from the config registry. """
+    return get_registry().languages
@@ -0,0 +1,60 @@
+"""
+fixtures/capture.py
+
+Record real NetNutrition responses into the golden corpus, so the parser
+tests and the replay benchmarks run on live markup:
+
+    python fixtures/capture.py                    # every hall in halls.json, 2 menus each
+    python fixtures/capture.py --units 1 6 --menus 3
+
+Writes menuPanel_captured_<unit>.html and
+itemPanel_captured_<unit>_<date>_<meal>.html to fixtures/netnutrition, then
+their goldens with the bs4 reference parser (fixtures/goldens.py). Check the
+goldens against the live site by hand before committing them. Upstream is
+NETNUTRITION_URL, as for the bots.
+"""
+
+import argparse
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import config.config as cfg
+from fixtures.goldens import CORPUS, update
+from services.netnutrition import get_client
+from utils.parser import parse_unit_menu_panel
+
+
+def _write(name: str, html: str) -> str:
+    with open(os.path.join(CORPUS, name + ".html"), "w", encoding="utf-8") as file:
+        file.write(html)
+    print(f"captured {name} ({len(html)} bytes)")
+    return name
+
+
+def capture(units, menus_per_unit: int) -> list[str]:
+    """Record each unit's menu panel and its first ``menus_per_unit`` item panels; return the page names."""
+    client = get_client()
+    names = []
+    for unit in units:
+        panels = client.post_panels("Unit/SelectUnitFromUnitsList", {"unitOid": unit})
+        names.append(_write(f"menuPanel_captured_{unit}", panels["menuPanel"]))
+        menus = [(date, meal, oid)
+                 for date, meals in sorted(parse_unit_menu_panel(panels["menuPanel"]).items())
+                 for meal, oid in meals.items()][:menus_per_unit]
+        for date, meal, oid in menus:
+            panels = client.post_panels("Menu/SelectMenu", {"menuOid": oid})
+            slug = meal.lower().replace(" ", "-")
+            names.append(_write(f"itemPanel_captured_{unit}_{date}_{slug}", panels["itemPanel"]))
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--units", nargs="*", help="unitOids to record (default: every hall in halls.json)")
+    parser.add_argument("--menus", type=int, default=2, help="item panels to record per unit")
+    args = parser.parse_args()
+    units = args.units or [hall['pid'] for hall in cfg.load_halls()]
+    update(capture(units, args.menus))
+
+
+if __name__ == "__main__":
+    main()
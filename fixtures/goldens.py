@@ -0,0 +1,56 @@
+"""
+fixtures/goldens.py
+
+The parser golden corpus in fixtures/netnutrition: for every <name>.html,
+<name>.json is what utils.parser must produce from it (and for item panels
+<name>.items.json, the dishes with their dietary tags). tests/test_parsers.py
+checks every backend against these files.
+
+Pages named *_captured_* are real NetNutrition responses recorded with
+fixtures/capture.py; the others are hand-built pages mimicking that markup,
+covering cases real pages may not show on a given day (an empty menu,
+dietary icons, badges, tables nested in rows).
+
+    python fixtures/goldens.py            # regenerate every golden with the bs4 reference parser
+    python fixtures/goldens.py NAME ...   # only these pages
+
+Regenerated goldens come from a parser under test: review the diff before
+committing it.
+"""
+
+import glob
+import json
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.parser import parse_menu, parse_menu_items, parse_unit_menu_panel
+
+CORPUS = os.path.join(os.path.dirname(__file__), "netnutrition")
+PARSERS = {"itemPanel": parse_menu, "menuPanel": parse_unit_menu_panel}
+# Extra goldens, checked as <name>.<suffix>.json
+EXTRA_PARSERS = {"itemPanel": {"items": parse_menu_items}}
+
+
+def cases(names=None):
+    """Yield (case name, golden path, parser, html) for every golden of every page in the corpus."""
+    for html_path in sorted(glob.glob(os.path.join(CORPUS, "*.html"))):
+        name = os.path.basename(html_path)[:-len(".html")]
+        if names and name not in names:
+            continue
+        base, kind = html_path[:-len(".html")], name.split("_")[0]
+        with open(html_path, encoding="utf-8") as file:
+            html = file.read()
+        yield name, base + ".json", PARSERS[kind], html
+        for suffix, parse in EXTRA_PARSERS.get(kind, {}).items():
+            yield f"{name}.{suffix}", f"{base}.{suffix}.json", parse, html
+
+
+def update(names=None):
+    for name, golden_path, parse, html in cases(names):
+        with open(golden_path, "w", encoding="utf-8") as file:
+            json.dump(parse(html, backend="bs4"), file, indent=4, ensure_ascii=False)
+            file.write("\n")
+        print(f"wrote {golden_path}")
+
+
+if __name__ == "__main__":
+    update(sys.argv[1:])
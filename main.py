@@ -1,11 +1,151 @@
+import argparse
+import importlib
+import multiprocessing
+import multiprocessing.connection
+import signal
+import subprocess
 import sys
+import time
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from bots.telegram_bot import start_telegram_bot
-# from bots.discord_bot import start_discord_bot
+# The module each role imports; nothing else is loaded up front
+ROLE_MODULES = {
+    'telegram': 'bots.telegram_bot',
+    'discord': 'bots.discord_bot',
+    'worker': 'services.prefetch',
+}
+
+
+def run_role(role, shard=0, shards=1, env=None):
+    """ Run one bot or refresh worker in the current process; imports only what that role needs. """
+    os.environ.update(env or {})
+    module = importlib.import_module(ROLE_MODULES[role])
+    if role == 'telegram':
+        module.start_telegram_bot()
+    elif role == 'discord':
+        module.start_discord_bot()
+    elif role == 'worker':
+        import config.config as cfg
+        from utils import metrics
+        metrics.start_metrics_server(**cfg.load_metrics_config())
+        module.run_worker(shard, shards)
+
+
+def profile_startup(roles, top=15):
+    """
+    Print where the import time of each role goes, measured with
+    ``python -X importtime`` in a fresh interpreter, without starting anything.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    for role in dict.fromkeys(role for role, _, _ in roles):
+        module = ROLE_MODULES[role]
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                cwd=here, capture_output=True, text=True)
+        wall = time.perf_counter() - started
+
+        entries = []  # (self us, cumulative us, module name)
+        for line in result.stderr.splitlines():
+            if line.startswith('import time:') and '|' in line and 'self [us]' not in line:
+                own, cumulative, name = line[len('import time:'):].split('|')
+                entries.append((int(own), int(cumulative), name.strip()))
+        total = next((cumulative for _, cumulative, name in entries if name == module), 0)
+        packages = {}
+        for own, _, name in entries:
+            packages[name.split('.')[0]] = packages.get(name.split('.')[0], 0) + own
+
+        print(f"== {role}: import {module} {total / 1000:.1f} ms, process wall time {wall * 1000:.0f} ms")
+        if result.returncode != 0:
+            print(result.stderr.strip().splitlines()[-1])
+        print("   by top-level package (self time):")
+        for package, own in sorted(packages.items(), key=lambda kv: -kv[1])[:top]:
+            print(f"   {own / 1000:9.1f} ms  {package}")
+        print("   slowest modules (cumulative):")
+        for own, cumulative, name in sorted(entries, key=lambda e: -e[1])[:top]:
+            print(f"   {cumulative / 1000:9.1f} ms  {name}")
+
+
+def launch(roles):
+    """
+    Run every (role, shard, shards) in its own process against the shared
+    cache backend (SQLite unless SHARED_BACKEND says otherwise). Stops all
+    of them on SIGINT/SIGTERM or as soon as one exits, and returns its exit code.
+
+    Menus are refreshed by one party only: the refresh workers when there are
+    any, else the first bot's prefetch scheduler. Bots that do not refresh
+    follow the menu store, so their notifications and /find index see those menus.
+    """
+    os.environ.setdefault('SHARED_BACKEND', 'sqlite')
+    metrics_port = int(os.getenv('METRICS_PORT', '9108'))
+    has_workers = any(role == 'worker' for role, _, _ in roles)
+    bot_env = {}
+    if has_workers and 'SHARED_CACHE_FRESH_FOR' not in os.environ:
+        import config.config as cfg
+        prefetch, shared = cfg.load_prefetch_config(), cfg.load_shared_cache_config()
+        # A worker rewrites each entry once per round; until the next round is
+        # overdue, bots reuse it instead of scraping the menu themselves
+        bot_env['SHARED_CACHE_FRESH_FOR'] = str(prefetch['interval'] + prefetch['jitter'] + shared['lease_ttl'])
+    context = multiprocessing.get_context('spawn')
+    processes = []
+    stopping = []
+    for index, (role, shard, shards) in enumerate(roles):
+        # One /metrics port per process: METRICS_PORT, METRICS_PORT + 1, ...
+        env = {'METRICS_PORT': str(metrics_port + index if metrics_port else 0)}
+        if role != 'worker':
+            env.update(bot_env)
+            if has_workers or index > 0:
+                env['PREFETCH_ENABLED'] = '0'
+                env['STORE_SYNC_INTERVAL'] = os.getenv('STORE_SYNC_INTERVAL', '60')
+        name = f"{role}-{shard}" if role == 'worker' else role
+        process = context.Process(target=run_role, args=(role, shard, shards, env), name=name)
+        process.start()
+        processes.append(process)
+        print(f"[INFO] started {name} (pid {process.pid})")
+
+    def stop(*_):
+        stopping.append(True)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    multiprocessing.connection.wait([process.sentinel for process in processes])
+    exited = None
+    if not stopping:
+        exited = next(process for process in processes if not process.is_alive())
+        print(f"[INFO] {exited.name} exited with {exited.exitcode}, stopping the others")
+        stop()
+    for process in processes:
+        process.join()
+    return 0 if exited is None else exited.exitcode or 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the WolfBite bots and refresh workers.")
+    parser.add_argument('--telegram', action='store_true', help="run the Telegram bot (default when nothing is selected)")
+    parser.add_argument('--discord', action='store_true', help="run the Discord bot")
+    parser.add_argument('--workers', type=int, default=0, help="number of menu refresh worker processes")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="print an import-time breakdown of the selected roles and exit")
+    args = parser.parse_args(argv)
+
+    roles = []
+    if args.telegram or not (args.discord or args.workers):
+        roles.append(('telegram', 0, 1))
+    if args.discord:
+        roles.append(('discord', 0, 1))
+    roles += [('worker', shard, args.workers) for shard in range(args.workers)]
+
+    if args.profile_startup:
+        profile_startup(roles)
+        return 0
+    if len(roles) == 1:
+        run_role(*roles[0])
+        return 0
+    return launch(roles)
 
 
 if __name__ == '__main__':
-    start_telegram_bot()
-    # start_discord_bot()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+services/cache.py
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils import metrics
+
+
+class TTLCache:
+    """
+    Bounded LRU cache with per-entry TTL and stale-while-revalidate.
+
+    An entry is *fresh* for ``ttl`` seconds, then *stale* for another
+    ``stale_ttl`` seconds: stale hits are served immediately while a single
+    background thread reloads the key. ``None`` results ("no menu") are kept
+    for the shorter ``negative_ttl`` and are never served stale.
+    A ``name`` makes lookups count towards the cache_lookups_total metric.
+    ``on_evict(key, value)`` is called, outside the lock, for every entry
+    dropped by the LRU bound, expiry, invalidate() or clear(), so data kept
+    alongside the cache can be dropped with it.
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float = 0, negative_ttl: float = 0, max_entries: int = 256,
+                 name: str = None, on_evict: Callable[[Hashable, Any], None] = None):
+        self.name = name
+        self.on_evict = on_evict
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._data: "OrderedDict[Hashable, tuple[Any, float, float]]" = OrderedDict()  # key -> (value, stored_at, ttl)
+        self._refreshing: set = set()
+        self._lock = threading.Lock()
+
+    def set(self, key: Hashable, value: Any, age: float = 0):
+        """Store a value; ``age`` back-dates it, e.g. for values restored from disk."""
+        ttl = self.negative_ttl if value is None else self.ttl
+        evicted = []
+        with self._lock:
+            self._data[key] = (value, time.monotonic() - age, ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                evicted.append(self._data.popitem(last=False))
+        self._evicted(evicted)
+
+    def lookup(self, key: Hashable, count: bool = True) -> tuple[str, Any, float]:
+        """
+        Return (state, value, stored_at) where state is 'fresh', 'stale' or
+        'miss' and stored_at is when the value was stored, in epoch seconds
+        (back-dated by set()'s ``age``), or None on a miss.
+        ``count=False`` keeps internal peeks out of the hit/miss metrics.
+        """
+        state, value, stored_at = self._lookup(key)
+        if count:
+            self.record(state)
+        return state, value, stored_at
+
+    def _lookup(self, key: Hashable) -> tuple[str, Any, float]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return "miss", None, None
+            value, stored_at, ttl = entry
+            age = time.monotonic() - stored_at
+            if age < ttl:
+                self._data.move_to_end(key)
+                return "fresh", value, time.time() - age
+            if value is not None and age < ttl + self.stale_ttl:
+                self._data.move_to_end(key)
+                return "stale", value, time.time() - age
+            del self._data[key]
+        self._evicted([(key, entry)])
+        return "miss", None, None
+
+    def _evicted(self, items):
+        if self.on_evict is None:
+            return
+        for key, (value, _, _) in items:
+            try:
+                self.on_evict(key, value)
+            except Exception as e:
+                print(f"[WARN] eviction hook failed for {key}: {e}")
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        state, value, _ = self.lookup(key, count=False)
+        return default if state == "miss" else value
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        if entry is not None:
+            self._evicted([(key, entry)])
+
+    def record(self, result: str):
+        """Count a lookup result ('fresh', 'stale' or 'miss'), e.g. for a peek made with count=False."""
+        if self.name:
+            metrics.inc("cache_lookups_total", cache=self.name, result=result)
+
+    def clear(self):
+        with self._lock:
+            evicted = list(self._data.items())
+            self._data.clear()
+        self._evicted(evicted)
+
+    def __len__(self):
+        return len(self._data)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        Serve ``key`` from the cache, calling ``loader`` on a miss.
+        Stale entries are returned as-is and refreshed in the background.
+        """
+        state, value, _ = self.lookup(key)
+        if state == "fresh":
+            return value
+        if state == "stale":
+            self.refresh_in_background(key, loader)
+            return value
+        value = loader()
+        self.set(key, value)
+        return value
+
+    def refresh_in_background(self, key: Hashable, loader: Callable[[], Any]):
+        """Reload ``key`` on a background thread unless a reload is already running."""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                self.set(key, loader())
+            except Exception as e:
+                # Keep serving the stale copy; the next hit will try again
+                print(f"[WARN] background refresh of {key} failed: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, name=f"refresh-{key}", daemon=True).start()
+
+
+class RenderCache:
+    """
+    Bounded LRU cache of rendered message text.
+
+    Each entry remembers the menu it was rendered from and that menu's content
+    hash. A lookup with the very same menu object is a plain dict hit; a new
+    object (e.g. after a background refresh) is hashed and only re-rendered
+    when its content actually changed.
+    """
+
+    def __init__(self, hash_fn: Callable[[Any], str], max_entries: int = 512, name: str = None):
+        self.name = name
+        self.hash_fn = hash_fn
+        self.max_entries = max_entries
+        self._data: "OrderedDict[Hashable, list]" = OrderedDict()  # key -> [menu, content hash, text]
+        self._lock = threading.Lock()
+
+    def get_or_render(self, key: Hashable, menu: Any, render: Callable[[], str]) -> str:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] is menu:
+                self._data.move_to_end(key)
+                self._count("fresh")
+                return entry[2]
+
+        content_hash = self.hash_fn(menu)
+        if entry is not None and entry[1] == content_hash:
+            with self._lock:
+                entry[0] = menu
+            self._count("fresh")
+            return entry[2]
+
+        self._count("miss")
+        text = render()
+        with self._lock:
+            self._data[key] = [menu, content_hash, text]
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+        return text
+
+    def _count(self, result: str):
+        if self.name:
+            metrics.inc("cache_lookups_total", cache=self.name, result=result)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,178 @@
+"""
+services/diets.py
+
+Dietary and allergen tags of menu dishes ("Vegan", "Contains Peanuts", ...).
+
+Each scraped menu carries a compact diet record next to it, one bitmask per
+dish, and every loaded menu gets a DietIndex that maps a tag to the set of
+dishes carrying it as one int. Filters such as "/start vegan, no peanuts"
+are then a few bit operations over the cached menu: no re-parsing and no
+upstream request.
+"""
+
+from typing import NamedTuple, Optional
+
+
+def tag_key(label: str) -> str:
+    """Canonical tag name, shared by page labels and user input: 'Contains Peanuts' -> 'peanut'."""
+    key = " ".join(label.lower().replace("-", " ").split())
+    if key.startswith("contains "):
+        key = key[len("contains "):]
+    if len(key) > 3 and key.endswith("s") and not key.endswith("ss"):
+        key = key[:-1]
+    return key
+
+
+def split_items(items: dict) -> tuple[dict, dict]:
+    """
+    Split utils.parser.parse_menu_items output into the plain menu (as
+    parse_menu returns it) and its diet record:
+        {"tags": ["halal", "gluten", ...], "dishes": [bitmask, ...]}
+    with one bitmask per dish in menu order; bit i is set when the dish
+    carries tags[i]. Both halves are JSON-serialisable.
+    """
+    menu, tags, dishes = {}, {}, []
+    for category, entries in items.items():
+        menu[category] = [dish for dish, _ in entries]
+        for _, labels in entries:
+            mask = 0
+            for label in labels:
+                mask |= 1 << tags.setdefault(tag_key(label), len(tags))
+            dishes.append(mask)
+    return menu, {"tags": list(tags), "dishes": dishes}
+
+
+class DietFilter(NamedTuple):
+    """Tags every shown dish must carry, and tags none of them may carry."""
+    require: frozenset
+    exclude: frozenset
+
+    @property
+    def text(self) -> str:
+        """Canonical form, e.g. 'vegan, no peanut'; from_text(text) gives the filter back."""
+        return ", ".join(sorted(self.require) + [f"no {tag}" for tag in sorted(self.exclude)])
+
+    @classmethod
+    def from_text(cls, text: str) -> Optional["DietFilter"]:
+        """Read back a stored ``text``; None for an empty one."""
+        require, exclude = set(), set()
+        for part in filter(None, (part.strip() for part in text.split(","))):
+            if part.startswith("no "):
+                exclude.add(part[3:])
+            else:
+                require.add(part)
+        if not (require or exclude):
+            return None
+        return cls(frozenset(require), frozenset(exclude))
+
+
+_NEGATIONS = ("no", "without")
+_CONNECTORS = ("and", "or", "nor")
+
+
+def parse_diet_filter(words, vocabulary) -> tuple[Optional[DietFilter], list[str]]:
+    """
+    Parse a filter typed after /start (a string or the command's word list)
+    against ``vocabulary``, the tag_key names of the tags menus carry:
+    'vegan', 'no peanuts', 'vegan halal, without tree nuts', 'gluten-free',
+    '-milk', 'no peanuts and soy vegan'.
+
+    Tags are matched longest first, so multi-word tags ('tree nut') and tags
+    containing 'and' stay whole. 'no'/'without' or a leading '-' excludes the
+    next tag and every tag joined to it by 'and'/'or'; a trailing 'free'
+    excludes the tag before it. Returns (filter, unknown) where filter is None
+    when no tag was recognised and unknown lists the phrases that match no
+    tag, in input order; they are left out of the filter.
+    """
+    text = words if isinstance(words, str) else " ".join(words)
+    keys = {}
+    for tag in vocabulary:
+        keys[tuple(tag.split())] = tag
+    longest = max((len(k) for k in keys), default=0)
+
+    require, exclude, unknown = set(), set(), []
+    for phrase in text.lower().split(","):
+        tokens = []
+        for word in phrase.split():
+            if word.startswith("-") and len(word) > 1:
+                tokens.append("no")
+                word = word[1:]
+            tokens += word.replace("-", " ").split()
+
+        negate, chained, pending = False, False, []
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            if token in _NEGATIONS or token in _CONNECTORS:
+                negate = negate or token in _NEGATIONS or chained
+                chained = False
+                i += 1
+                continue
+            for size in range(min(longest, len(tokens) - i), 0, -1):
+                tag = keys.get(tuple(tag_key(" ".join(tokens[i:i + size])).split()))
+                if tag is not None:
+                    break
+            else:
+                pending.append(token)
+                i += 1
+                continue
+            if pending:
+                unknown.append(" ".join(pending))
+                pending = []
+            i += size
+            if i < len(tokens) and tokens[i] == "free":
+                negate, i = True, i + 1
+            (exclude if negate else require).add(tag)
+            negate, chained = False, negate
+        if pending:
+            unknown.append(" ".join(pending))
+
+    if not (require or exclude):
+        return None, unknown
+    return DietFilter(frozenset(require), frozenset(exclude)), unknown
+
+
+class DietIndex:
+    """
+    Inverted bitset index of one menu: for every tag, an int with bit n set
+    when the n-th dish of the menu (in menu order) carries the tag.
+    Built once per loaded menu from its diet record.
+    """
+    __slots__ = ("menu", "dishes", "tags")
+
+    def __init__(self, menu: dict, record: dict):
+        self.menu = menu
+        self.dishes = sum(len(items) for items in menu.values())
+        if len(record["dishes"]) != self.dishes:
+            raise ValueError(f"diet record has {len(record['dishes'])} dishes, menu has {self.dishes}")
+        names = record["tags"]
+        self.tags = dict.fromkeys(names, 0)
+        for position, mask in enumerate(record["dishes"]):
+            while mask:
+                bit = mask & -mask
+                self.tags[names[bit.bit_length() - 1]] |= 1 << position
+                mask ^= bit
+
+    def matches(self, menu: dict) -> bool:
+        """Whether the index describes this menu content."""
+        return menu is self.menu or menu == self.menu
+
+    def select(self, diet: DietFilter) -> int:
+        """Bitset of the dishes that pass ``diet``."""
+        selected = (1 << self.dishes) - 1
+        for tag in diet.require:
+            selected &= self.tags.get(tag, 0)
+        for tag in diet.exclude:
+            selected &= ~self.tags.get(tag, 0)
+        return selected
+
+    def filter(self, diet: DietFilter) -> dict:
+        """The menu reduced to the dishes passing ``diet``; categories left empty are dropped."""
+        selected = self.select(diet)
+        result, position = {}, 0
+        for category, items in self.menu.items():
+            kept = [dish for n, dish in enumerate(items, position) if selected >> n & 1]
+            position += len(items)
+            if kept:
+                result[category] = kept
+        return result
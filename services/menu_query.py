@@ -3,84 +3,464 @@ services/menu_query.py
 """
 
 import datetime
-import re
-import requests
-from bs4 import BeautifulSoup
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from zoneinfo import ZoneInfo
 import os, sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from utils.parser import parse_menu
+from utils.parser import parse_menu_items, parse_unit_menu_panel
+from services.netnutrition import NetNutritionClient, get_client
+from services.cache import RenderCache, TTLCache
+from services.diets import DietFilter, DietIndex, split_items
+from services.menu_store import MenuStore, menu_hash
+from services.singleflight import SingleFlight
+from services.resilience import CircuitBreaker, CircuitOpenError, with_retries
+from services.shared_cache import get_shared_cache
+import config.config as cfg
+from utils import metrics
 
 
 # Configuration
 UNIT_MAP = {"fountain": 1, "clark": 2, "case": 3, "oval": 6}
-HEADERS = {
-    "User-Agent": "Mozilla/5.0",
-    "X-Requested-With": "XMLHttpRequest",
-    "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
-}
-
-
-def _init_session() -> requests.Session:
-    s = requests.Session()
-    s.headers.update(HEADERS)
-    home = "https://netmenu2.cbord.com/NetNutrition/ncstate-dining"
-    s.get(home, timeout=10)
-    return s
-
-def _parse_unit_menu_panel(html: str) -> dict[str, dict[str, int]]:
-    soup, out = BeautifulSoup(html, "html.parser"), {}
-    for card in soup.select("section.card"):
-        header = card.find("header", class_="card-title")
-        if not header:
-            continue
-        date_key = datetime.datetime.strptime(
-            header.get_text(strip=True), "%A, %B %d, %Y"
-        ).strftime("%Y-%m-%d")
-
-        out[date_key] = {}
-        for link in card.select("a.cbo_nn_menuLink"):
-            meal = link.get_text(strip=True)
-            if m := re.search(r"\((\d+)\)", link.get("onclick", "")):
-                out[date_key][meal] = int(m.group(1))
-    return out
-
-def _get_unit_menus(s: requests.Session, unitOid: int):
-    url  = "https://netmenu2.cbord.com/NetNutrition/ncstate-dining/Unit/SelectUnitFromUnitsList"
-    resp = s.post(url, data={"unitOid": unitOid}, timeout=10)
-
-    if not resp.headers.get("Content-Type", "").startswith("application/json"):
-        raise RuntimeError(
-            f"Unit has no JSON, got {resp.headers.get('Content-Type')}\n"
-            f"First 300 chars: {resp.text[:300]}"
-        )
+TIMEZONE = ZoneInfo("America/New_York")
 
-    menu_html = next(p["html"] for p in resp.json()["panels"] if p["id"] == "menuPanel")
-    return _parse_unit_menu_panel(menu_html)
+_cache_config = cfg.load_cache_config()
+# Parsed menus keyed by (unitOid, date, meal); a menu's dietary index goes with it
+menu_cache = TTLCache(**_cache_config, name="menu",
+                      on_evict=lambda key, menu: _drop_diets(key, menu))
+# date -> meal -> menuOid for every date a unit publishes, keyed by unitOid
+unit_menus_cache = TTLCache(**cfg.load_unit_map_cache_config(), name="unit_menus")
+# (unitOid, date) pairs missing from the unit's freshly fetched map; held as long as a "no menu" result,
+# so lookups of an unpublished date do not re-fetch the map every time
+unpublished_dates = TTLCache(ttl=_cache_config['negative_ttl'], max_entries=_cache_config['max_entries'])
+# Fully rendered, translated reply text keyed by (bot, unitOid, date, meal, language)
+rendered_menus = RenderCache(menu_hash, name="rendered")
+# Concurrent lookups of the same (unitOid, date, meal), or of one unit's map, share one upstream fetch
+inflight = SingleFlight(**cfg.load_singleflight_config())
 
+_resilience = cfg.load_resilience_config()
+# Shared by every upstream call: opens after repeated failures so users fail fast
+breaker = CircuitBreaker(_resilience['failure_threshold'], _resilience['reset_timeout'])
 
-def fetch_menu_data(date: str, meal: str, unitOid: int):
+metrics.register_gauge("menu_cache_entries", lambda: len(menu_cache))
+metrics.register_gauge("upstream_circuit_open", lambda: breaker.state != "closed")
+
+# Content hash of the last menu loaded per (unitOid, date, meal); None = known to have no menu.
+# Keys restored by warm_from_store are baselines: only a later edit counts as a change. Any
+# other key is new to this deployment, so its first load is the menu being posted.
+# Past dates are pruned once a day.
+_menu_hashes: dict[tuple[str, str, str], str] = {}
+# When the content in _menu_hashes was fetched (epoch seconds), so sync_from_store never
+# replaces a menu this process loaded with an older row still waiting in the store's write queue
+_menu_seen_at: dict[tuple[str, str, str], float] = {}
+_hashes_pruned_on = None
+# Dietary tag index of the menu last loaded per (unitOid, date, meal), see filter_menu().
+# Entries leave together with their menu_cache entry, so this stays within its bound.
+_diet_indexes: dict[tuple[str, str, str], DietIndex] = {}
+_change_listeners = []
+_menu_listeners = []
+# Tags /start filters are checked against, see known_tags()
+_known_tags = TTLCache(ttl=300, max_entries=1)
+
+_store = None
+_store_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+_parse_unit_menu_panel = parse_unit_menu_panel
+
+def _post_panels(client: NetNutritionClient, path: str, data: dict) -> dict[str, str]:
     """
-    date: 'YYYY-MM-DD', meal: 'breakfast'|'lunch'|'dinner', unit: 'fountain'|'clark'
+    client.post_panels behind the circuit breaker, retrying transient errors with jitter.
+    Every failed attempt counts towards upstream_errors_total and the breaker,
+    and retries stop as soon as the breaker opens.
     """
-    s = _init_session()
-    menus_map = _get_unit_menus(s, unitOid)
+    def attempt():
+        try:
+            return client.post_panels(path, data)
+        except Exception as e:
+            metrics.inc("upstream_errors_total", path=path, error=type(e).__name__)
+            raise
 
     try:
-        oid = menus_map[date][meal.capitalize()]
-    except KeyError:
+        return with_retries(
+            lambda: breaker.call(attempt),
+            attempts=_resilience['retries'],
+            base_delay=_resilience['retry_base_delay'],
+            max_delay=_resilience['retry_max_delay'],
+            deadline=_resilience['retry_deadline'],
+        )
+    except CircuitOpenError:
+        metrics.inc("upstream_errors_total", path=path, error="CircuitOpenError")
+        raise
+
+
+def _shared_load(key: tuple, loader):
+    """
+    Run ``loader`` through the cross-process cache when SHARED_BACKEND is set,
+    so other bot and worker processes reuse the result and only one of them
+    scrapes a given key at a time. Results must be JSON-serialisable.
+    """
+    shared = get_shared_cache()
+    if shared is None:
+        return loader()
+    return shared.get_or_load(":".join(str(part) for part in key), loader)
+
+
+def _get_unit_menus(client: NetNutritionClient, unitOid: int):
+    return inflight.do(("unit_menus", str(unitOid)), lambda: _shared_load(
+        ("unit_menus", unitOid), lambda: _fetch_unit_menus(client, unitOid)))
+
+
+def _fetch_unit_menus(client: NetNutritionClient, unitOid: int):
+    with metrics.timed("unit_menus", unit=unitOid):
+        panels = _post_panels(client, "Unit/SelectUnitFromUnitsList", {"unitOid": unitOid})
+    with metrics.timed("parse_unit_menus", unit=unitOid):
+        return _parse_unit_menu_panel(panels["menuPanel"])
+
+
+def _get_unit_menu_map(client: NetNutritionClient, unitOid: int, date: str = None) -> dict[str, dict[str, int]]:
+    """
+    Return the cached date -> meal -> menuOid map of a unit. Besides the daily
+    refresh, the map is only re-fetched when it does not know ``date`` yet
+    (a newly published day); a missing meal on a known date means "closed".
+    A date still missing after that re-fetch is not asked about again for a while.
+    """
+    key = str(unitOid)
+    state, menus_map, _ = unit_menus_cache.lookup(key)
+    if state == "miss" or (date is not None and date not in menus_map
+                           and unpublished_dates.get((key, date)) is None):
+        menus_map = _get_unit_menus(client, unitOid)
+        unit_menus_cache.set(key, menus_map)
+        if date is not None and date not in menus_map:
+            unpublished_dates.set((key, date), True)
+    elif state == "stale":
+        unit_menus_cache.refresh_in_background(key, lambda: _get_unit_menus(client, unitOid))
+    return menus_map
+
+
+def _get_menu_oid(client: NetNutritionClient, date: str, meal: str, unitOid: int):
+    meals = _get_unit_menu_map(client, unitOid, date).get(date, {})
+    if meal.capitalize() in meals:
+        return meals[meal.capitalize()]
+    # Multi-word meals ("Late Night") do not survive capitalize()
+    return next((oid for name, oid in meals.items() if name.lower() == meal.lower()), None)
+
+
+def get_menu_store() -> MenuStore:
+    """Return the process-wide on-disk menu store, opening it on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = MenuStore(**cfg.load_menu_store_config())
+        return _store
+
+
+def today() -> str:
+    return datetime.datetime.now(TIMEZONE).strftime("%Y-%m-%d")
+
+
+def _menu_key(date: str, meal: str, unitOid: int) -> tuple[str, str, str]:
+    return str(unitOid), date, meal.lower()
+
+
+def _scrape_menu(date: str, meal: str, unitOid: int):
+    """Return (menu, diets record) of one menu, or None when the unit serves no such meal."""
+    client = get_client()
+    oid = _get_menu_oid(client, date, meal, unitOid)
+    if oid is None:
         print(f"[WARN] {unitOid} {date} {meal} no menu")
         return None
 
-    resp = s.post(
-        "https://netmenu2.cbord.com/NetNutrition/ncstate-dining/Menu/SelectMenu",
-        data={"menuOid": oid},
-        timeout=10,
+    with metrics.timed("select_menu", unit=unitOid, date=date, meal=meal):
+        panels = _post_panels(client, "Menu/SelectMenu", {"menuOid": oid})
+    with metrics.timed("parse_menu", unit=unitOid, date=date, meal=meal):
+        return split_items(parse_menu_items(panels["itemPanel"]))
+
+
+def _load_menu(date: str, meal: str, unitOid: int):
+    """Load a menu, joining an identical in-flight load if there is one."""
+    return inflight.do(_menu_key(date, meal, unitOid), lambda: _load_menu_once(date, meal, unitOid))
+
+
+def _load_menu_once(date: str, meal: str, unitOid: int):
+    """Scrape a menu and queue it for the on-disk store; past dates are answered from the store only."""
+    if date < today():
+        row = get_menu_store().get(unitOid, date, meal)
+        return row[0] if row else None
+    key = _menu_key(date, meal, unitOid)
+    previous = menu_cache.get(key)
+
+    def scrape():
+        scraped = _scrape_menu(date, meal, unitOid)
+        if scraped is not None:
+            get_menu_store().put(unitOid, date, meal, *scraped)
+        return scraped
+
+    menu, diets = _shared_load(("menu_items",) + key, scrape) or (None, None)
+    _set_diets(key, menu, diets)
+    _record_hash(key, menu, previous)
+    return menu
+
+
+def _set_diets(key, menu, diets):
+    if menu is None or diets is None:
+        _diet_indexes.pop(key, None)
+        return
+    index = _diet_indexes.get(key)
+    if index is None or not index.matches(menu):
+        _diet_indexes[key] = DietIndex(menu, diets)
+
+
+def _drop_diets(key, menu):
+    # Only the index of the evicted menu: a reload may already have replaced it
+    index = _diet_indexes.get(key)
+    if index is not None and index.menu is menu:
+        _diet_indexes.pop(key, None)
+
+
+def filter_menu(date: str, meal: str, unitOid: int, menu: dict, diet: DietFilter):
+    """
+    Return ``menu`` reduced to the dishes passing ``diet``, answered from the
+    dietary index built when the menu was loaded (or from the store for menus
+    served from it): no parsing and no upstream request. Returns None when no
+    dietary tags are known for this menu.
+    """
+    key = _menu_key(date, meal, unitOid)
+    index = _diet_indexes.get(key)
+    if index is None or not index.matches(menu):
+        # Not kept: menus served from the store bypass menu_cache, which bounds the indexes
+        row = get_menu_store().get_diets(unitOid, date, meal)
+        if row is None or row[0] != menu:
+            return None
+        index = DietIndex(*row)
+    return index.filter(diet)
+
+
+def known_tags() -> frozenset:
+    """
+    Dietary tags (services.diets.tag_key names) carried by the menus loaded
+    here or stored for today and later: the vocabulary of /start filters.
+    Re-read from the store every few minutes.
+    """
+    def load():
+        tags = get_menu_store().diet_tags(today())
+        for index in list(_diet_indexes.values()):
+            tags.update(index.tags)
+        return frozenset(tags)
+    return _known_tags.get_or_load("tags", load)
+
+
+def add_change_listener(listener):
+    """
+    Register listener(key, menu, previous) to be called whenever a loaded menu's
+    content hash differs from the last one seen for its (unitOid, date, meal)
+    key, including the first load of a key not restored by warm_from_store
+    (a newly published menu). ``previous`` is the prior menu when still
+    cached, else None.
+    Listeners run on the loading thread and should only hand work off.
+    """
+    _change_listeners.append(listener)
+
+
+def add_menu_listener(listener):
+    """
+    Register listener(key, menu) to be called with every menu content not
+    seen before for its key, including the first sighting and menus restored
+    by warm_from_store. Used to maintain derived indexes.
+    """
+    _menu_listeners.append(listener)
+
+
+def _prune_hashes():
+    """Forget the hashes of past dates; they are never loaded from upstream again."""
+    global _hashes_pruned_on
+    current = today()
+    if _hashes_pruned_on == current:
+        return
+    _hashes_pruned_on = current
+    for key in [key for key in list(_menu_hashes) if key[1] < current]:
+        _menu_hashes.pop(key, None)
+        _menu_seen_at.pop(key, None)
+
+
+def _record_hash(key, menu, previous, content_hash=None, emit_change=True, seen_at=None):
+    _prune_hashes()
+    if content_hash is None and menu is not None:
+        content_hash = menu_hash(menu)
+    if key in _menu_hashes and _menu_hashes[key] == content_hash:
+        return
+    _menu_hashes[key] = content_hash
+    _menu_seen_at[key] = time.time() if seen_at is None else seen_at
+    listeners = [(listener, (key, menu)) for listener in _menu_listeners]
+    if emit_change:
+        listeners += [(listener, (key, menu, previous)) for listener in _change_listeners]
+    for listener, args in listeners:
+        try:
+            listener(*args)
+        except Exception as e:
+            print(f"[WARN] menu listener failed for {key}: {e}")
+
+
+def warm_from_store() -> int:
+    """
+    Seed menu_cache with today's and later menus persisted by earlier runs,
+    so a restarted bot answers immediately. Old rows come back as stale and
+    are refreshed in the background on first hit. Returns the number loaded.
+    """
+    rows = get_menu_store().since(today())
+    for unit, date, meal, menu, content_hash, fetched_at, diets in rows:
+        # Index first: if the cache overflows while warming, evicting the menu drops its index too
+        _set_diets((unit, date, meal), menu, diets)
+        menu_cache.set((unit, date, meal), menu, age=min(time.time() - fetched_at, menu_cache.ttl))
+        _record_hash((unit, date, meal), menu, None, content_hash, emit_change=False, seen_at=fetched_at)
+    return len(rows)
+
+
+def sync_from_store() -> int:
+    """
+    Pick up menus other processes (refresh workers, the prefetching bot)
+    wrote to the store: every row of today or later whose content differs
+    from, and is newer than, the copy last seen here replaces the cached
+    menu and goes through the change and menu listeners, exactly as if this
+    process had scraped it. Returns the number of menus picked up.
+    """
+    store = get_menu_store()
+    picked = 0
+    for key, (content_hash, fetched_at) in store.hashes(today()).items():
+        if _menu_hashes.get(key) == content_hash or fetched_at <= _menu_seen_at.get(key, 0):
+            continue
+        row = store.get(*key)
+        if row is None or row[1] != content_hash:
+            continue  # replaced since the hashes were read; the next sync takes the new row
+        menu = row[0]
+        tagged = store.get_diets(*key)
+        previous = menu_cache.get(key)
+        _set_diets(key, menu, tagged[1] if tagged and tagged[0] == menu else None)
+        menu_cache.set(key, menu, age=min(time.time() - fetched_at, menu_cache.ttl))
+        _record_hash(key, menu, previous, content_hash, seen_at=fetched_at)
+        picked += 1
+    return picked
+
+
+def fetch_menu(date: str, meal: str, unitOid: int):
+    """
+    Like fetch_menu_data, but returns (menu, as_of). as_of is None for a
+    current menu. When upstream is failing or the circuit is open, the last
+    stored copy is returned instead with as_of set to its fetch time (epoch
+    seconds); without one the error propagates. A stale cached copy served
+    while the circuit is not closed carries its fetch time too, since its
+    background refresh cannot succeed yet.
+    """
+    key = _menu_key(date, meal, unitOid)
+    state, menu, stored_at = menu_cache.lookup(key, count=False)
+    if state == "stale" and breaker.state != "closed":
+        menu_cache.record(state)
+        # Still queued: once the breaker lets a trial call through, this refresh is it
+        menu_cache.refresh_in_background(key, lambda: _load_menu(date, meal, unitOid))
+        return menu, stored_at
+    try:
+        return fetch_menu_data(date, meal, unitOid), None
+    except Exception as e:
+        row = get_menu_store().get(unitOid, date, meal)
+        if row is None:
+            raise
+        if not isinstance(e, CircuitOpenError):
+            print(f"[WARN] {unitOid} {date} {meal} upstream failed, serving stored copy: {e}")
+        return row[0], row[2]
+
+
+def fetch_menu_data(date: str, meal: str, unitOid: int):
+    """
+    date: 'YYYY-MM-DD', meal: 'breakfast'|'lunch'|'dinner', unit: 'fountain'|'clark'
+    Served from menu_cache; upstream is only hit on a miss or a stale refresh.
+    """
+    return menu_cache.get_or_load(
+        _menu_key(date, meal, unitOid),
+        lambda: _load_menu(date, meal, unitOid),
     )
-    if not resp.headers.get("Content-Type", "").startswith("application/json"):
-        raise RuntimeError("Menu has no JSON")
 
-    item_html = next(p["html"] for p in resp.json()["panels"] if p["id"] == "itemPanel")
-    return parse_menu(item_html)
+
+def refresh_menu(date: str, meal: str, unitOid: int):
+    """
+    Scrape a menu unconditionally and store it in menu_cache.
+    Returns (menu, changed) where changed compares against the cached copy.
+    """
+    key = _menu_key(date, meal, unitOid)
+    previous = menu_cache.get(key)
+    menu = _load_menu(date, meal, unitOid)
+    menu_cache.set(key, menu)
+    return menu, menu != previous
+
+
+def iter_menus(start: str, end: str, unitOids=None, workers: int = 4):
+    """
+    Bulk fetch: yield (unitOid, date, meal, menu) for every menu the given
+    units (default: every hall in halls.json) publish between start and end
+    ('YYYY-MM-DD', inclusive), in completion order.
+
+    Each unit's menu map costs one cached SelectUnit call; every menu after
+    that is a single SelectMenu POST, run ``workers`` at a time through the
+    same cache, single-flight and circuit breaker as fetch_menu_data.
+    Failed menus are logged and skipped.
+    """
+    units = [str(u) for u in unitOids] if unitOids else [hall['pid'] for hall in cfg.load_halls()]
+    client = get_client()
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="menu-bulk")
+    try:
+        maps = {}
+        for unit, future in [(unit, pool.submit(_get_unit_menu_map, client, unit)) for unit in units]:
+            try:
+                maps[unit] = future.result()
+            except Exception as e:
+                print(f"[WARN] {unit} menu map unavailable: {e}")
+
+        futures = {
+            pool.submit(fetch_menu_data, date, meal.lower(), unit): (unit, date, meal.lower())
+            for unit, menus_map in maps.items()
+            for date, meals in sorted(menus_map.items()) if start <= date <= end
+            for meal in meals
+        }
+        for future in as_completed(futures):
+            unit, date, meal = futures[future]
+            try:
+                menu = future.result()
+            except Exception as e:
+                print(f"[WARN] {unit} {date} {meal} bulk fetch failed: {e}")
+                continue
+            yield unit, date, meal, menu
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=cfg.load_netnutrition_config()['max_concurrency'],
+                thread_name_prefix="menu-fetch",
+            )
+        return _executor
+
+
+async def fetch_menu_async(date: str, meal: str, unitOid: int):
+    """
+    Awaitable fetch_menu for asyncio front-ends (the Discord bot).
+    Fresh cache hits return inline; anything that may touch upstream runs on
+    a bounded executor so the event loop keeps serving other users.
+    """
+    state, menu, _ = menu_cache.lookup(_menu_key(date, meal, unitOid), count=False)
+    if state == "fresh":
+        # Served inline from this very lookup: looking the key up again could
+        # find it expired and scrape on the event loop
+        menu_cache.record(state)
+        return menu, None
+    import asyncio  # only the Discord front-end needs it
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), fetch_menu, date, meal, unitOid)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,153 @@
+"""
+services/menu_store.py
+"""
+
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS menus (
+    unit         TEXT NOT NULL,
+    date         TEXT NOT NULL,
+    meal         TEXT NOT NULL,
+    menu         TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    fetched_at   REAL NOT NULL,
+    diets        TEXT,
+    PRIMARY KEY (unit, date, meal)
+)
+"""
+
+
+def menu_hash(menu) -> str:
+    """Stable content hash of a parsed menu."""
+    return hashlib.sha1(json.dumps(menu, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class MenuStore:
+    """
+    SQLite-backed store of parsed menus keyed by (unit, date, meal).
+
+    ``put`` only enqueues the row; a background writer thread commits queued
+    rows in batches so callers (bot handlers) never wait on disk I/O.
+    Reads go through their own connection, which WAL mode lets run alongside writes.
+    """
+
+    def __init__(self, path: str, batch_size: int = 50, flush_interval: float = 2.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._read_lock = threading.Lock()
+        self._reader = self._connect()
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        threading.Thread(target=self._write_loop, name="menu-store-writer", daemon=True).start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(SCHEMA)
+        # Stores written before dietary tags were kept lack the diets column
+        if "diets" not in {row[1] for row in conn.execute("PRAGMA table_info(menus)")}:
+            try:
+                conn.execute("ALTER TABLE menus ADD COLUMN diets TEXT")
+            except sqlite3.OperationalError as e:
+                if "duplicate column" not in str(e):  # another connection migrated first
+                    raise
+        conn.commit()
+        return conn
+
+    def put(self, unit: str, date: str, meal: str, menu: dict, diets: dict = None):
+        """Queue a menu, and its services.diets record if known, for writing; returns immediately."""
+        self._queue.put((str(unit), date, meal.lower(), json.dumps(menu, ensure_ascii=False),
+                         menu_hash(menu), time.time(), None if diets is None else json.dumps(diets)))
+
+    def flush(self):
+        """Block until every queued write has been committed."""
+        self._queue.join()
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                with conn:
+                    conn.executemany("INSERT OR REPLACE INTO menus VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+            except sqlite3.Error as e:
+                print(f"[WARN] menu store dropped {len(batch)} rows: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def get(self, unit: str, date: str, meal: str):
+        """Return (menu, content_hash, fetched_at) or None."""
+        with self._read_lock:
+            row = self._reader.execute(
+                "SELECT menu, content_hash, fetched_at FROM menus WHERE unit=? AND date=? AND meal=?",
+                (str(unit), date, meal.lower()),
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1], row[2]
+
+    def get_diets(self, unit: str, date: str, meal: str):
+        """Return (menu, diets record) or None when the menu or its dietary tags were never stored."""
+        with self._read_lock:
+            row = self._reader.execute(
+                "SELECT menu, diets FROM menus WHERE unit=? AND date=? AND meal=? AND diets IS NOT NULL",
+                (str(unit), date, meal.lower()),
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), json.loads(row[1])
+
+    def hashes(self, date: str) -> dict[tuple[str, str, str], tuple[str, float]]:
+        """Return {(unit, date, meal): (content_hash, fetched_at)} for every menu on or after date, without the menus."""
+        with self._read_lock:
+            rows = self._reader.execute(
+                "SELECT unit, date, meal, content_hash, fetched_at FROM menus WHERE date >= ?", (date,),
+            ).fetchall()
+        return {(u, d, m): (h, t) for u, d, m, h, t in rows}
+
+    def diet_tags(self, date: str) -> set[str]:
+        """Return every dietary tag carried by a menu stored for date or later."""
+        with self._read_lock:
+            rows = self._reader.execute(
+                "SELECT diets FROM menus WHERE date >= ? AND diets IS NOT NULL", (date,),
+            ).fetchall()
+        return {tag for (diets,) in rows for tag in json.loads(diets)["tags"]}
+
+    def since(self, date: str) -> list[tuple]:
+        """
+        Return [(unit, date, meal, menu, content_hash, fetched_at, diets), ...] for
+        every menu on or after date; diets is None for rows stored without tags.
+        """
+        with self._read_lock:
+            rows = self._reader.execute(
+                "SELECT unit, date, meal, menu, content_hash, fetched_at, diets FROM menus WHERE date >= ?",
+                (date,),
+            ).fetchall()
+        return [(u, d, m, json.loads(menu), h, t, json.loads(diets) if diets else None)
+                for u, d, m, menu, h, t, diets in rows]
+
+    def history(self, unit: str, start: str, end: str) -> list[tuple]:
+        """Return [(date, meal, menu), ...] stored for a unit between start and end (inclusive)."""
+        with self._read_lock:
+            rows = self._reader.execute(
+                "SELECT date, meal, menu FROM menus WHERE unit=? AND date BETWEEN ? AND ? ORDER BY date, meal",
+                (str(unit), start, end),
+            ).fetchall()
+        return [(d, m, json.loads(menu)) for d, m, menu in rows]
@@ -0,0 +1,101 @@
+"""
+services/netnutrition.py
+"""
+
+import threading
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import config.config as cfg
+from utils import metrics
+
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0",
+    "X-Requested-With": "XMLHttpRequest",
+    "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
+}
+
+
+class NetNutritionClient:
+    """
+    Long-lived NetNutrition client shared by every menu lookup.
+
+    One keep-alive ``requests.Session`` with a pooled adapter is reused for all
+    calls. The cookie session is opened lazily and renewed only when upstream
+    stops answering with JSON (its way of saying the session expired).
+    At most ``max_concurrency`` requests are in flight; further callers wait
+    for a free slot instead of opening new connections.
+    """
+
+    def __init__(self, base_url: str, timeout: float = 10, connect_timeout: float = 3,
+                 pool_size: int = 8, max_concurrency: int = 8):
+        self.base_url = base_url.rstrip("/")
+        # A short connect timeout makes an unreachable upstream fail fast
+        self.timeout = (connect_timeout, timeout)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._generation = 0  # bumped every time the cookie session is (re)opened
+
+        # requests costs tens of milliseconds to import; only pay for it once a client is needed
+        import requests
+        from requests.adapters import HTTPAdapter
+        self._session = requests.Session()
+        self._session.headers.update(HEADERS)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+    def _open(self):
+        """Fetch the home page so upstream hands out fresh session cookies."""
+        self._session.cookies.clear()
+        with self._slots, metrics.timed("session_init"):
+            self._session.get(self.base_url, timeout=self.timeout)
+        self._generation += 1
+
+    def _ensure_session(self) -> int:
+        with self._lock:
+            if self._generation == 0:
+                self._open()
+            return self._generation
+
+    def _renew(self, generation: int):
+        with self._lock:
+            # Another thread may already have renewed it while we were waiting
+            if generation == self._generation:
+                self._open()
+
+    def post_panels(self, path: str, data: dict) -> dict[str, str]:
+        """
+        POST to a NetNutrition endpoint and return its panels as {panel id: html}.
+        A non-JSON answer is treated as an expired session: renew it once and retry.
+        """
+        for attempt in range(2):
+            generation = self._ensure_session()
+            with self._slots:
+                resp = self._session.post(f"{self.base_url}/{path}", data=data, timeout=self.timeout)
+            if resp.status_code == 429 or resp.status_code >= 500:
+                resp.raise_for_status()
+            if resp.headers.get("Content-Type", "").startswith("application/json"):
+                return {p["id"]: p["html"] for p in resp.json()["panels"]}
+            if attempt == 0:
+                self._renew(generation)
+
+        raise RuntimeError(
+            f"{path} has no JSON, got {resp.headers.get('Content-Type')}\n"
+            f"First 300 chars: {resp.text[:300]}"
+        )
+
+    def close(self):
+        self._session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client() -> NetNutritionClient:
+    """Return the process-wide client, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = NetNutritionClient(**cfg.load_netnutrition_config())
+        return _client
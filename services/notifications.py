@@ -0,0 +1,158 @@
+"""
+services/notifications.py
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import config.config as cfg
+import services.menu_query as menu_query
+from utils.translator import translate_text
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscriptions (
+    bot      TEXT NOT NULL,
+    chat_id  INTEGER NOT NULL,
+    unit     TEXT NOT NULL,
+    meal     TEXT NOT NULL,
+    keyword  TEXT NOT NULL DEFAULT '',
+    language TEXT NOT NULL,
+    PRIMARY KEY (bot, chat_id, unit, meal, keyword)
+)
+"""
+
+
+class SubscriptionStore:
+    """
+    Persistent menu-change subscriptions. An empty keyword means "tell me when
+    this hall/meal is posted or changes"; otherwise "when a dish containing
+    the keyword appears".
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(SCHEMA)
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def add(self, bot: str, chat_id: int, unit: str, meal: str, keyword: str, language: str):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO subscriptions VALUES (?, ?, ?, ?, ?, ?)",
+                             (bot, chat_id, str(unit), meal.lower(), keyword.lower(), language))
+
+    def remove_all(self, bot: str, chat_id: int) -> int:
+        with self._lock, self._db:
+            return self._db.execute("DELETE FROM subscriptions WHERE bot=? AND chat_id=?", (bot, chat_id)).rowcount
+
+    def for_chat(self, bot: str, chat_id: int) -> list[tuple]:
+        """Return [(unit, meal, keyword), ...] for one chat."""
+        with self._lock:
+            return self._db.execute("SELECT unit, meal, keyword FROM subscriptions WHERE bot=? AND chat_id=?",
+                                    (bot, chat_id)).fetchall()
+
+    def matching(self, unit: str, meal: str) -> list[tuple]:
+        """Return [(bot, chat_id, keyword, language), ...] subscribed to a hall/meal."""
+        with self._lock:
+            return self._db.execute("SELECT bot, chat_id, keyword, language FROM subscriptions WHERE unit=? AND meal=?",
+                                    (str(unit), meal.lower())).fetchall()
+
+
+class Notifier:
+    """
+    Turns menu change events into subscriber messages.
+
+    on_menu_change (a menu_query change listener) only matches subscriptions
+    and queues texts. A sender thread wakes every ``batch_interval`` seconds,
+    merges everything queued for the same chat into one message and sends at
+    most ``rate_per_second`` messages per second through the sender each bot
+    registered.
+    """
+
+    def __init__(self, subscriptions: SubscriptionStore, rate_per_second: float = 20, batch_interval: float = 2):
+        self.subscriptions = subscriptions
+        self.rate_per_second = rate_per_second
+        self.batch_interval = batch_interval
+        self._senders = {}
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        threading.Thread(target=self._send_loop, name="notifier", daemon=True).start()
+
+    def register_sender(self, bot: str, send):
+        """send(chat_id, text) delivers one message; it is called from the notifier thread."""
+        self._senders[bot] = send
+
+    def on_menu_change(self, key, menu, previous):
+        unit, date, meal = key
+        if menu is None:
+            return
+        dishes = [dish for items in menu.values() for dish in items]
+        previous_dishes = {dish for items in (previous or {}).values() for dish in items}
+        hall_name = cfg.get_registry().hall_name(unit)
+        for bot, chat_id, keyword, language in self.subscriptions.matching(unit, meal):
+            if bot not in self._senders:
+                continue
+            heading = f"{hall_name} {meal} {date}:"
+            if not keyword:
+                text = f"{heading} {translate_text('The menu has been posted or updated.', language)}"
+            else:
+                hits = [dish for dish in dishes if keyword in dish.lower() and dish not in previous_dishes]
+                if not hits:
+                    continue
+                text = f"{heading} " + ", ".join(hits)
+            self._queue.put((bot, chat_id, text))
+
+    def _send_loop(self):
+        interval = 1 / self.rate_per_second
+        while True:
+            time.sleep(self.batch_interval)
+            batch = {}
+            while True:
+                try:
+                    bot, chat_id, text = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.setdefault((bot, chat_id), []).append(text)
+            for (bot, chat_id), texts in batch.items():
+                started = time.monotonic()
+                try:
+                    self._senders[bot](chat_id, "\n".join(texts))
+                except Exception as e:
+                    print(f"[WARN] notification to {bot}:{chat_id} failed: {e}")
+                time.sleep(max(0, interval - (time.monotonic() - started)))
+
+
+_notifier = None
+_notifier_lock = threading.Lock()
+
+def get_notifier() -> Notifier:
+    """Return the process-wide notifier, creating it and hooking it into menu_query on first use."""
+    global _notifier
+    with _notifier_lock:
+        if _notifier is None:
+            conf = cfg.load_notification_config()
+            _notifier = Notifier(SubscriptionStore(conf['path']), conf['rate_per_second'], conf['batch_interval'])
+            menu_query.add_change_listener(_notifier.on_menu_change)
+        return _notifier
+
+
+def parse_subscription(args: list[str]):
+    """
+    Parse '<hall> <meal> [keyword ...]' (hall names may contain spaces) into
+    (hall, meal, keyword) or None when no hall/meal can be recognised.
+    """
+    registry = cfg.get_registry()
+    lowered = [arg.lower() for arg in args]
+    periods = {period.lower() for period in registry.periods}
+    for i, word in enumerate(lowered):
+        if word in periods:
+            hall = registry.find_hall(' '.join(args[:i]))
+            if hall is None:
+                return None
+            return hall, word, ' '.join(lowered[i + 1:])
+    return None
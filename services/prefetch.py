@@ -0,0 +1,114 @@
+"""
+services/prefetch.py
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import config.config as cfg
+import services.menu_query as menu_query
+
+
+# Metrics of the most recent warm-up run, see prefetch_all()
+last_run: dict = {}
+_scheduler_stop = None
+
+
+def _target_dates() -> list[str]:
+    today = datetime.now(menu_query.TIMEZONE)
+    return [(today + timedelta(days=d)).strftime('%Y-%m-%d') for d in (0, 1)]
+
+
+def prefetch_all(workers: int = 4, shard: int = 0, shards: int = 1) -> dict:
+    """
+    Scrape every hall x period for today and tomorrow into the menu cache.
+    With ``shards`` > 1 only every shards-th job starting at ``shard`` is run,
+    so several worker processes split the work between them.
+    Returns the run's metrics: duration, number of jobs, failures and changed menus.
+    """
+    jobs = [(date, period, hall['pid'])
+            for date in _target_dates()
+            for hall in cfg.load_halls()
+            for period in cfg.load_periods()][shard::shards]
+
+    started = time.monotonic()
+    failures, changed = 0, 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch") as pool:
+        futures = {pool.submit(menu_query.refresh_menu, *job): job for job in jobs}
+        for future in as_completed(futures):
+            try:
+                _, menu_changed = future.result()
+                changed += menu_changed
+            except Exception as e:
+                failures += 1
+                print(f"[WARN] prefetch {futures[future]} failed: {e}")
+
+    metrics = {
+        'finished_at': datetime.now(menu_query.TIMEZONE).isoformat(timespec='seconds'),
+        'duration': round(time.monotonic() - started, 3),
+        'jobs': len(jobs),
+        'failures': failures,
+        'changed': changed,
+    }
+    last_run.clear()
+    last_run.update(metrics)
+    print(f"[INFO] prefetch {metrics}")
+    return metrics
+
+
+def _run_forever(interval: float, jitter: float, workers: int, stop: threading.Event, shard: int = 0, shards: int = 1):
+    while not stop.is_set():
+        try:
+            prefetch_all(workers, shard, shards)
+        except Exception as e:
+            print(f"[WARN] prefetch run crashed: {e}")
+        # Jitter keeps replicas / restarts from hitting upstream in lockstep
+        stop.wait(interval + random.uniform(0, jitter))
+
+
+def _sync_forever(interval: float, stop: threading.Event):
+    while not stop.wait(interval):
+        try:
+            menu_query.sync_from_store()
+        except Exception as e:
+            print(f"[WARN] menu store sync failed: {e}")
+
+
+def start_scheduler() -> threading.Event:
+    """
+    Start the warm-up loop, and the menu store sync loop when another process
+    does the scraping, on daemon threads according to load_prefetch_config().
+    Safe to call from several bots: only the first call starts the loops.
+    Returns an Event that stops them once set.
+    """
+    global _scheduler_stop
+    if _scheduler_stop is not None:
+        return _scheduler_stop
+    conf = cfg.load_prefetch_config()
+    stop = _scheduler_stop = threading.Event()
+    if conf['enabled']:
+        threading.Thread(
+            target=_run_forever,
+            args=(conf['interval'], conf['jitter'], conf['workers'], stop),
+            name="prefetch-scheduler",
+            daemon=True,
+        ).start()
+    if conf['sync_interval'] > 0:
+        threading.Thread(target=_sync_forever, args=(conf['sync_interval'], stop),
+                         name="store-sync", daemon=True).start()
+    return stop
+
+
+def run_worker(shard: int = 0, shards: int = 1):
+    """
+    Body of a dedicated refresh worker process: run this worker's share of
+    the warm-up jobs on the prefetch schedule, forever, in the calling thread.
+    Scraped menus reach the bot processes through the shared cache.
+    """
+    conf = cfg.load_prefetch_config()
+    menu_query.warm_from_store()
+    _run_forever(conf['interval'], conf['jitter'], conf['workers'], threading.Event(), shard, shards)
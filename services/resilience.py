@@ -0,0 +1,101 @@
+"""
+services/resilience.py
+"""
+
+import random
+import sys
+import threading
+import time
+from typing import Any, Callable
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling upstream while the circuit breaker is open."""
+
+
+def is_transient(error: Exception) -> bool:
+    """
+    Connection errors (connect timeouts included), 429 and 5xx are worth
+    retrying; anything else is not. A read timeout is not: upstream already
+    held the request for the whole timeout and would likely do so again.
+    """
+    # Not imported here: if requests was never loaded, the error cannot come from it
+    requests = sys.modules.get("requests")
+    if requests is None:
+        return False
+    if isinstance(error, requests.ConnectionError):
+        return True
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return False
+
+
+def with_retries(fn: Callable[[], Any], attempts: int = 3, base_delay: float = 0.2, max_delay: float = 2.0,
+                 deadline: float = None) -> Any:
+    """
+    Call ``fn``, retrying transient errors with exponential backoff and full
+    jitter (a random sleep in [0, min(max_delay, base_delay * 2**n)]).
+    With a ``deadline`` no retry starts more than that many seconds after the
+    first call; the last error is raised instead.
+    """
+    started = time.monotonic()
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == attempts - 1 or not is_transient(e):
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            if deadline is not None and time.monotonic() + delay - started > deadline:
+                raise
+            time.sleep(delay)
+
+
+class CircuitBreaker:
+    """
+    Fail fast while upstream is unhealthy.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    every call raises CircuitOpenError immediately. Once ``reset_timeout``
+    seconds have passed a single trial call is let through: success closes
+    the circuit, failure re-opens it for another ``reset_timeout``.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._probing or time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            if self._opened_at is not None:
+                if self._probing or time.monotonic() - self._opened_at < self.reset_timeout:
+                    raise CircuitOpenError("upstream circuit is open")
+                self._probing = True
+
+        try:
+            result = fn()
+        except Exception:
+            with self._lock:
+                self._failures += 1
+                if self._probing or self._failures >= self.failure_threshold:
+                    self._opened_at = time.monotonic()
+                self._probing = False
+            raise
+
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+        return result
@@ -0,0 +1,105 @@
+"""
+services/search.py
+"""
+
+import re
+import threading
+import unicodedata
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import config.config as cfg
+import services.menu_query as menu_query
+from utils.translator import translate_many
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Normalise dish text into search tokens: accents folded, lower-cased,
+    split on anything that is not a letter or digit, naive plural 's' dropped.
+    """
+    folded = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode().lower()
+    tokens = []
+    for word in re.findall(r"[a-z0-9]+", folded):
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+class DishIndex:
+    """
+    In-memory inverted index token -> {(unit, date, meal, category, dish), ...}.
+
+    Fed incrementally with parsed menus (add_menu replaces everything indexed
+    for that (unit, date, meal)), so a search never touches upstream.
+    """
+
+    def __init__(self):
+        self._postings: dict[str, set] = {}
+        self._by_menu: dict[tuple, list[tuple]] = {}  # (unit, date, meal) -> [(token, entry), ...]
+        self._lock = threading.Lock()
+
+    def add_menu(self, key, menu):
+        unit, date, meal = key
+        entries = [(token, (unit, date, meal, category, dish))
+                   for category, dishes in (menu or {}).items()
+                   for dish in dishes
+                   for token in set(tokenize(dish))]
+        with self._lock:
+            self._remove(key)
+            for token, entry in entries:
+                self._postings.setdefault(token, set()).add(entry)
+            if entries:
+                self._by_menu[key] = entries
+
+    def _remove(self, key):
+        for token, entry in self._by_menu.pop(key, []):
+            posting = self._postings.get(token)
+            if posting is not None:
+                posting.discard(entry)
+                if not posting:
+                    del self._postings[token]
+
+    def prune(self, before: str):
+        """Drop every menu dated before 'YYYY-MM-DD'."""
+        with self._lock:
+            for key in [key for key in self._by_menu if key[1] < before]:
+                self._remove(key)
+
+    def search(self, query: str, since: str = None, limit: int = 50) -> list[tuple]:
+        """
+        Return up to ``limit`` (unit, date, meal, category, dish) entries whose
+        dish contains every query token, ordered by date, unit and meal.
+        """
+        tokens = set(tokenize(query))
+        if not tokens:
+            return []
+        with self._lock:
+            postings = sorted((self._postings.get(token, set()) for token in tokens), key=len)
+            hits = set(postings[0]).intersection(*postings[1:])
+        if since is not None:
+            hits = {hit for hit in hits if hit[1] >= since}
+        return sorted(hits)[:limit]
+
+    def __len__(self):
+        return len(self._by_menu)
+
+
+dish_index = DishIndex()
+menu_query.add_menu_listener(dish_index.add_menu)
+
+
+def find_dishes(query: str, limit: int = 50) -> list[tuple]:
+    """Search today's and later menus; older menus are pruned on the way."""
+    today = menu_query.today()
+    dish_index.prune(today)
+    return dish_index.search(query, since=today, limit=limit)
+
+
+def format_results(results: list[tuple], language: str) -> list[str]:
+    """One line per hit: 'date hall meal - category: dish', with category and dish translated."""
+    registry = cfg.get_registry()
+    categories = translate_many([hit[3] for hit in results], language)
+    dishes = translate_many([hit[4] for hit in results], language)
+    return [f"{date} {registry.hall_name(unit)} {meal} - {category}: {dish}"
+            for (unit, date, meal, _, _), category, dish in zip(results, categories, dishes)]
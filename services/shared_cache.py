@@ -0,0 +1,242 @@
+"""
+services/shared_cache.py
+
+Cache and lease storage shared by every process of a deployment (both bots
+and any number of refresh workers), so a menu scraped by one process is
+served by all of them and each key is scraped by one process at a time.
+
+Backends implement the small SharedBackend interface:
+
+    MemoryBackend   in-process fake, for tests and single-process runs
+    SQLiteBackend   one SQLite file in WAL mode, shared by processes on one host
+    RedisBackend    any Redis-compatible server (needs the optional ``redis`` package)
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Optional
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import config.config as cfg
+from utils import metrics
+
+
+class SharedBackend:
+    """
+    Values are JSON-serialisable and expire after ``ttl`` seconds. Leases are
+    named locks that expire on their own, so a crashed holder cannot block a
+    key for longer than the lease TTL.
+    """
+
+    def get(self, key: str) -> Optional[tuple[Any, float]]:
+        """Return (value, stored_at epoch seconds), or None when absent or expired."""
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: float):
+        raise NotImplementedError
+
+    def acquire(self, name: str, ttl: float) -> Optional[str]:
+        """Take lease ``name`` for ``ttl`` seconds; return a release token, or None if it is held."""
+        raise NotImplementedError
+
+    def release(self, name: str, token: str):
+        """Give a lease back; a token that no longer holds it is ignored."""
+        raise NotImplementedError
+
+
+class MemoryBackend(SharedBackend):
+
+    def __init__(self):
+        self._values: dict[str, tuple[str, float, float]] = {}  # key -> (json, stored_at, expires_at)
+        self._leases: dict[str, tuple[str, float]] = {}         # name -> (token, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._values.get(key)
+        if entry is None or entry[2] <= time.time():
+            return None
+        return json.loads(entry[0]), entry[1]
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._lock:
+            self._values[key] = (json.dumps(value), now, now + ttl)
+
+    def acquire(self, name, ttl):
+        now = time.time()
+        with self._lock:
+            lease = self._leases.get(name)
+            if lease is not None and lease[1] > now:
+                return None
+            token = uuid.uuid4().hex
+            self._leases[name] = (token, now + ttl)
+            return token
+
+    def release(self, name, token):
+        with self._lock:
+            if self._leases.get(name, (None,))[0] == token:
+                del self._leases[name]
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS shared_values (
+    key        TEXT PRIMARY KEY,
+    value      TEXT NOT NULL,
+    stored_at  REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS shared_leases (
+    name       TEXT PRIMARY KEY,
+    token      TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+class SQLiteBackend(SharedBackend):
+    """Every process opens the same file; WAL mode lets readers run alongside the writer."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=10, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SQLITE_SCHEMA)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT value, stored_at FROM shared_values WHERE key=? AND expires_at>?",
+                                   (key, time.time())).fetchone()
+        return None if row is None else (json.loads(row[0]), row[1])
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO shared_values VALUES (?, ?, ?, ?)",
+                             (key, json.dumps(value, ensure_ascii=False), now, now + ttl))
+            # Expired rows are only cleared on write, which keeps reads cheap
+            self._db.execute("DELETE FROM shared_values WHERE expires_at<=?", (now,))
+
+    def acquire(self, name, ttl):
+        now = time.time()
+        token = uuid.uuid4().hex
+        with self._lock:
+            # Insert, or take over an expired lease; a live lease leaves the row untouched
+            taken = self._db.execute(
+                "INSERT INTO shared_leases VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET token=excluded.token, expires_at=excluded.expires_at "
+                "WHERE shared_leases.expires_at<=?",
+                (name, token, now + ttl, now)).rowcount
+        return token if taken == 1 else None
+
+    def release(self, name, token):
+        with self._lock:
+            self._db.execute("DELETE FROM shared_leases WHERE name=? AND token=?", (name, token))
+
+
+class RedisBackend(SharedBackend):
+
+    # Delete the lease only if it still carries our token
+    _RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, url: str, prefix: str = "wolfbite:"):
+        try:
+            import redis  # optional; imported only when this backend is selected
+        except ImportError:
+            raise RuntimeError("SHARED_BACKEND=redis needs the 'redis' package: pip install redis") from None
+        self._redis = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key):
+        raw = self._redis.get(self._prefix + key)
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        return entry['value'], entry['stored_at']
+
+    def set(self, key, value, ttl):
+        self._redis.set(self._prefix + key, json.dumps({'value': value, 'stored_at': time.time()}),
+                        px=max(1, int(ttl * 1000)))
+
+    def acquire(self, name, ttl):
+        token = uuid.uuid4().hex
+        if self._redis.set(self._prefix + "lease:" + name, token, nx=True, px=max(1, int(ttl * 1000))):
+            return token
+        return None
+
+    def release(self, name, token):
+        self._redis.eval(self._RELEASE, 1, self._prefix + "lease:" + name, token)
+
+
+class CoordinatedCache:
+    """
+    Cross-process get-or-load on top of a SharedBackend.
+
+    A value younger than ``fresh_for`` seconds is returned as-is. Otherwise
+    the process that wins the key's lease runs the loader and publishes the
+    result (kept ``keep_for`` seconds); the others poll for that result for
+    up to ``wait`` seconds. If the lease holder dies or fails, its lease is
+    released or expires and the next poller takes over, so each key has one
+    refresher at a time across every worker.
+    """
+
+    def __init__(self, backend: SharedBackend, fresh_for: float = 300, keep_for: float = 86400,
+                 lease_ttl: float = 30, wait: float = 30, poll_interval: float = 0.05):
+        self.backend = backend
+        self.fresh_for = fresh_for
+        self.keep_for = keep_for
+        self.lease_ttl = lease_ttl
+        self.wait = wait
+        self.poll_interval = poll_interval
+
+    def get_or_load(self, key: str, loader: Callable[[], Any]) -> Any:
+        started = time.time()
+        deadline = time.monotonic() + self.wait
+        while True:
+            entry = self.backend.get(key)
+            if entry is not None and (started - entry[1] < self.fresh_for or entry[1] >= started):
+                metrics.inc("shared_cache_lookups_total", result="hit")
+                return entry[0]
+            token = self.backend.acquire("load:" + key, self.lease_ttl)
+            if token is not None:
+                metrics.inc("shared_cache_lookups_total", result="load")
+                try:
+                    value = loader()
+                    self.backend.set(key, value, self.keep_for)
+                    return value
+                finally:
+                    self.backend.release("load:" + key, token)
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"waited {self.wait}s for another worker to load {key}")
+            time.sleep(self.poll_interval)
+
+
+def create_backend(kind: str, url: str) -> Optional[SharedBackend]:
+    if kind == 'none':
+        return None
+    if kind == 'memory':
+        return MemoryBackend()
+    if kind == 'sqlite':
+        return SQLiteBackend(url)
+    if kind == 'redis':
+        return RedisBackend(url)
+    raise ValueError(f"unknown SHARED_BACKEND {kind!r}, expected none, memory, sqlite or redis")
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+def get_shared_cache() -> Optional[CoordinatedCache]:
+    """Return the process-wide CoordinatedCache per load_shared_cache_config(), or None when sharing is off."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            conf = cfg.load_shared_cache_config()
+            backend = create_backend(conf.pop('backend'), conf.pop('url'))
+            _shared = CoordinatedCache(backend, **conf) if backend is not None else False
+        return _shared or None
@@ -0,0 +1,55 @@
+"""
+services/singleflight.py
+"""
+
+import threading
+from typing import Any, Callable, Hashable
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls for the same key into one.
+
+    The first caller for a key runs ``fn``; callers arriving while it is in
+    flight wait for that result instead of starting their own. Exceptions are
+    re-raised in every waiter. Waiters give up with ``TimeoutError`` after
+    ``timeout`` seconds; the in-flight call itself keeps running.
+    """
+
+    def __init__(self, timeout: float = 30):
+        self.timeout = timeout
+        self._calls: dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: float = None) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if leader:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.done.set()
+        elif not call.done.wait(self.timeout if timeout is None else timeout):
+            raise TimeoutError(f"timed out waiting for in-flight {key}")
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def in_flight(self) -> int:
+        return len(self._calls)
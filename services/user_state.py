@@ -0,0 +1,147 @@
+"""
+services/user_state.py
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import config.config as cfg
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_state (
+    bot        TEXT NOT NULL,
+    user_id    INTEGER NOT NULL,
+    language   TEXT,
+    stage      INTEGER,
+    hall_pid   TEXT,
+    period     TEXT,
+    message_id INTEGER,
+    updated_at REAL NOT NULL,
+    diet       TEXT,
+    PRIMARY KEY (bot, user_id)
+)
+"""
+
+
+class UserState:
+    """Compact per-user record shared by both bots."""
+    __slots__ = ('language', 'stage', 'hall_pid', 'period', 'message_id', 'diet', 'touched')
+    FIELDS = ('language', 'stage', 'hall_pid', 'period', 'message_id', 'diet')
+
+    def __init__(self, language=None, stage=None, hall_pid=None, period=None, message_id=None, diet=None):
+        self.language = language
+        self.stage = stage
+        self.hall_pid = hall_pid
+        self.period = period
+        self.message_id = message_id
+        # Dietary filter given with /start, as services.diets.DietFilter.text
+        self.diet = diet
+        self.touched = time.monotonic()
+
+    def reset_conversation(self):
+        self.stage = self.hall_pid = self.period = self.message_id = self.diet = None
+
+
+class UserStateStore:
+    """
+    Bounded in-memory map of (bot, user id) -> UserState backed by SQLite.
+
+    At most ``max_users`` records are kept in memory (LRU); records idle for
+    ``idle_ttl`` seconds are evicted. Every update is written through, so an
+    evicted or restarted user comes back with their language. Conversation
+    fields older than ``idle_ttl`` are dropped when a record is reloaded.
+    """
+
+    def __init__(self, path: str, max_users: int = 5000, idle_ttl: float = 3600):
+        self.max_users = max_users
+        self.idle_ttl = idle_ttl
+        self._users: "OrderedDict[tuple, UserState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(SCHEMA)
+        # Stores created before dietary filters lack the diet column
+        if "diet" not in {row[1] for row in self._db.execute("PRAGMA table_info(user_state)")}:
+            try:
+                self._db.execute("ALTER TABLE user_state ADD COLUMN diet TEXT")
+            except sqlite3.OperationalError as e:
+                if "duplicate column" not in str(e):  # another process migrated first
+                    raise
+        self._db.commit()
+
+    def get(self, bot: str, user_id: int, default_language: str = 'English') -> UserState:
+        """Return the user's record, loading it from disk or creating a default one."""
+        key = (bot, user_id)
+        with self._lock:
+            state = self._users.get(key)
+            if state is None:
+                state = self._load(bot, user_id) or UserState(language=default_language)
+                self._users[key] = state
+            state.touched = time.monotonic()
+            self._users.move_to_end(key)
+            self._evict()
+            return state
+
+    def update(self, bot: str, user_id: int, default_language: str = 'English', **fields) -> UserState:
+        """Set the given fields (see UserState.FIELDS) and persist the record."""
+        state = self.get(bot, user_id, default_language)
+        with self._lock:
+            for name, value in fields.items():
+                if name not in UserState.FIELDS:
+                    raise ValueError(f"unknown user state field {name}")
+                setattr(state, name, value)
+            self._save(bot, user_id, state)
+        return state
+
+    def __len__(self):
+        return len(self._users)
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._users:
+            key, oldest = next(iter(self._users.items()))
+            if len(self._users) <= self.max_users and now - oldest.touched < self.idle_ttl:
+                break
+            del self._users[key]
+
+    def _load(self, bot: str, user_id: int):
+        row = self._db.execute(
+            "SELECT language, stage, hall_pid, period, message_id, diet, updated_at FROM user_state WHERE bot=? AND user_id=?",
+            (bot, user_id),
+        ).fetchone()
+        if row is None:
+            return None
+        state = UserState(*row[:6])
+        if time.time() - row[6] > self.idle_ttl:
+            state.reset_conversation()
+        return state
+
+    def _save(self, bot: str, user_id: int, state: UserState):
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO user_state "
+                "(bot, user_id, language, stage, hall_pid, period, message_id, updated_at, diet) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (bot, user_id, state.language, state.stage, state.hall_pid, state.period,
+                 state.message_id, time.time(), state.diet),
+            )
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_user_state_store() -> UserStateStore:
+    """Return the process-wide user state store, opening it on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = UserStateStore(**cfg.load_user_state_config())
+        return _store
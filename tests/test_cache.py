@@ -0,0 +1,100 @@
+"""
+tests/test_cache.py
+
+TTLCache: freshness, stale-while-revalidate, negative entries, LRU bound and on_evict.
+"""
+
+import threading
+import time
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from services.cache import TTLCache
+
+
+def test_fresh_stale_and_expired():
+    cache = TTLCache(ttl=60, stale_ttl=60)
+    cache.set("fresh", 1)
+    cache.set("stale", 2, age=90)
+    cache.set("gone", 3, age=150)
+    assert cache.lookup("fresh")[:2] == ("fresh", 1)
+    assert cache.lookup("stale")[:2] == ("stale", 2)
+    assert cache.lookup("gone")[:2] == ("miss", None)
+    assert len(cache) == 2
+
+
+def test_lookup_reports_when_the_value_was_stored():
+    cache = TTLCache(ttl=60, stale_ttl=60)
+    cache.set("key", 1, age=90)
+    assert cache.lookup("key")[2] == pytest.approx(time.time() - 90, abs=1)
+    assert cache.lookup("missing")[2] is None
+
+
+def test_stale_hit_is_served_and_refreshed_once_in_the_background():
+    cache = TTLCache(ttl=60, stale_ttl=60)
+    cache.set("key", "old", age=90)
+    release, calls = threading.Event(), []
+
+    def loader():
+        calls.append(1)
+        release.wait(5)
+        return "new"
+
+    assert cache.get_or_load("key", loader) == "old"
+    assert cache.get_or_load("key", loader) == "old"
+    release.set()
+    deadline = time.monotonic() + 5
+    while cache.lookup("key")[0] != "fresh" and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cache.lookup("key")[:2] == ("fresh", "new")
+    assert calls == [1]
+
+
+def test_failed_background_refresh_keeps_the_stale_value():
+    cache = TTLCache(ttl=60, stale_ttl=60)
+    cache.set("key", "old", age=90)
+    done = threading.Event()
+
+    def loader():
+        done.set()
+        raise RuntimeError("upstream down")
+
+    assert cache.get_or_load("key", loader) == "old"
+    done.wait(5)
+    time.sleep(0.05)
+    assert cache.lookup("key")[:2] == ("stale", "old")
+
+
+def test_none_uses_the_negative_ttl_and_is_never_stale():
+    cache = TTLCache(ttl=60, stale_ttl=600, negative_ttl=0.05)
+    assert cache.get_or_load("closed", lambda: None) is None
+    assert cache.lookup("closed")[0] == "fresh"
+    time.sleep(0.06)
+    assert cache.lookup("closed")[0] == "miss"
+
+
+def test_lru_bound_and_on_evict():
+    evicted = []
+    cache = TTLCache(ttl=60, stale_ttl=60, max_entries=2, on_evict=lambda key, value: evicted.append((key, value)))
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # "b" is now least recently used
+    cache.set("c", 3)
+    assert evicted == [("b", 2)]
+    assert cache.get("a") == 1 and cache.get("b") is None
+
+    cache.invalidate("a")
+    cache.set("old", 4, age=150)
+    cache.lookup("old")  # expired on lookup
+    cache.clear()
+    assert evicted == [("b", 2), ("a", 1), ("old", 4), ("c", 3)]
+
+
+def test_failing_eviction_hook_does_not_break_the_cache():
+    def hook(key, value):
+        raise RuntimeError("hook failed")
+
+    cache = TTLCache(ttl=60, max_entries=1, on_evict=hook)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("b") == 2 and len(cache) == 1
@@ -0,0 +1,68 @@
+"""
+tests/test_chat_executor.py
+
+ChatExecutor: per-chat order, concurrency across chats, failures and stats.
+"""
+
+import random
+import threading
+import time
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.chat_executor import ChatExecutor, percentile
+
+
+def test_jobs_of_one_chat_run_in_order_one_at_a_time():
+    executor = ChatExecutor(workers=8)
+    order, running, overlaps = {}, set(), []
+    lock = threading.Lock()
+
+    def job(chat, seq):
+        with lock:
+            if chat in running:
+                overlaps.append(chat)
+            running.add(chat)
+        time.sleep(random.uniform(0, 0.005))
+        with lock:
+            running.discard(chat)
+            order.setdefault(chat, []).append(seq)
+
+    for seq in range(200):
+        executor.submit(seq % 10, job, seq % 10, seq)
+    executor.shutdown()
+    assert overlaps == []
+    assert sorted(order) == list(range(10))
+    assert all(seqs == sorted(seqs) and len(seqs) == 20 for seqs in order.values())
+
+
+def test_a_slow_chat_does_not_hold_up_others():
+    executor = ChatExecutor(workers=2)
+    release, done = threading.Event(), threading.Event()
+    executor.submit("slow", release.wait, 5)
+    executor.submit("fast", done.set)
+    try:
+        assert done.wait(1)
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+def test_a_failing_job_does_not_stop_its_chat():
+    executor = ChatExecutor(workers=1)
+    ran = []
+
+    def fail():
+        raise RuntimeError("handler bug")
+
+    executor.submit(1, fail)
+    executor.submit(1, ran.append, "next")
+    executor.shutdown()
+    assert ran == ["next"]
+    stats = executor.stats()
+    assert stats['handled'] == 2 and stats['queued'] == 0 and stats['running'] == 0
+
+
+def test_percentile():
+    assert percentile([], 95) == 0.0
+    assert percentile([3, 1, 2], 50) == 2
+    assert percentile(range(101), 95) == 95
@@ -0,0 +1,92 @@
+"""
+tests/test_diets.py
+
+Dietary tag keys, diet records, filter parsing and the bitset index.
+"""
+
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from services.diets import DietFilter, DietIndex, parse_diet_filter, split_items, tag_key
+
+VOCABULARY = {"halal", "vegan", "vegetarian", "milk", "soy", "egg", "gluten", "peanut", "tree nut", "mac and cheese"}
+
+ITEMS = {
+    "Grill": [("Burger", ("Halal", "Contains Gluten")), ("Veggie Wrap", ("Vegan", "Contains Gluten"))],
+    "Sides": [("Fries", ("Vegan",)), ("Mac", ("Vegetarian", "Milk"))],
+}
+
+
+def allow(*require, exclude=()):
+    return DietFilter(frozenset(require), frozenset(exclude))
+
+
+@pytest.mark.parametrize("label, key", [
+    ("Vegan", "vegan"),
+    ("Contains Peanuts", "peanut"),
+    ("Tree-Nuts", "tree nut"),
+    ("Contains  Gluten", "gluten"),
+    ("Shellfish", "shellfish"),
+    ("Soy", "soy"),
+])
+def test_tag_key(label, key):
+    assert tag_key(label) == key
+
+
+def test_split_items():
+    menu, record = split_items(ITEMS)
+    assert menu == {"Grill": ["Burger", "Veggie Wrap"], "Sides": ["Fries", "Mac"]}
+    assert record == {"tags": ["halal", "gluten", "vegan", "vegetarian", "milk"], "dishes": [0b11, 0b110, 0b100, 0b11000]}
+
+
+@pytest.mark.parametrize("text, expected, unknown", [
+    ("vegan", allow("vegan"), []),
+    ("no peanuts", allow(exclude={"peanut"}), []),
+    ("no peanuts vegan", allow("vegan", exclude={"peanut"}), []),
+    ("vegan halal, without tree nuts", allow("vegan", "halal", exclude={"tree nut"}), []),
+    ("gluten-free", allow(exclude={"gluten"}), []),
+    ("tree nut free vegan", allow("vegan", exclude={"tree nut"}), []),
+    ("-milk", allow(exclude={"milk"}), []),
+    ("Contains Soy", allow("soy"), []),
+    # 'and' joins tags and carries a 'no' over; it never splits a tag
+    ("vegan and halal", allow("vegan", "halal"), []),
+    ("no peanuts and soy vegan", allow("vegan", exclude={"peanut", "soy"}), []),
+    ("no mac and cheese", allow(exclude={"mac and cheese"}), []),
+    ("vegan chocolate", allow("vegan"), ["chocolate"]),
+    ("kosher, no shellfish", None, ["kosher", "shellfish"]),
+    ("and", None, []),
+    ("", None, []),
+])
+def test_parse_diet_filter(text, expected, unknown):
+    assert parse_diet_filter(text, VOCABULARY) == (expected, unknown)
+
+
+def test_parse_diet_filter_without_vocabulary_recognises_nothing():
+    assert parse_diet_filter(["vegan"], set()) == (None, ["vegan"])
+
+
+def test_filter_text_round_trip():
+    diet, _ = parse_diet_filter("no peanuts and mac and cheese, vegan", VOCABULARY)
+    assert diet.text == "vegan, no mac and cheese, no peanut"
+    assert DietFilter.from_text(diet.text) == diet
+    assert DietFilter.from_text("") is None
+
+
+def test_diet_index_filter():
+    index = DietIndex(*split_items(ITEMS))
+    assert index.filter(allow("vegan")) == {"Grill": ["Veggie Wrap"], "Sides": ["Fries"]}
+    assert index.filter(allow(exclude={"gluten"})) == {"Sides": ["Fries", "Mac"]}
+    assert index.filter(allow("vegan", exclude={"gluten"})) == {"Sides": ["Fries"]}
+    assert index.filter(allow("halal", "vegan")) == {}
+    # Tags this menu never mentions: nothing carries them
+    assert index.filter(allow("kosher")) == {}
+    assert index.filter(allow(exclude={"kosher"})) == {"Grill": ["Burger", "Veggie Wrap"], "Sides": ["Fries", "Mac"]}
+
+
+def test_diet_index_matches_and_rejects_mismatched_records():
+    menu, record = split_items(ITEMS)
+    index = DietIndex(menu, record)
+    assert index.matches(menu) and index.matches({k: list(v) for k, v in menu.items()})
+    assert not index.matches({"Grill": ["Burger"]})
+    with pytest.raises(ValueError):
+        DietIndex({"Grill": ["Burger"]}, record)
@@ -0,0 +1,81 @@
+"""
+tests/test_menu_sync.py
+
+sync_from_store: menus another process wrote to the store reach this
+process's cache and listeners.
+"""
+
+import time
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+import services.menu_query as menu_query
+from services.menu_store import MenuStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = MenuStore(str(tmp_path / "menus.sqlite3"), flush_interval=0)
+    monkeypatch.setattr(menu_query, "_store", store)
+    monkeypatch.setattr(menu_query, "_menu_hashes", {})
+    monkeypatch.setattr(menu_query, "_menu_seen_at", {})
+    monkeypatch.setattr(menu_query, "_diet_indexes", {})
+    monkeypatch.setattr(menu_query, "_change_listeners", [])
+    monkeypatch.setattr(menu_query, "_menu_listeners", [])
+    monkeypatch.setattr(menu_query, "_known_tags", menu_query.TTLCache(ttl=300, max_entries=1))
+    menu_query.menu_cache.clear()
+    yield store
+    menu_query.menu_cache.clear()
+
+
+def test_rows_written_elsewhere_fire_listeners(store):
+    changes, menus = [], []
+    menu_query.add_change_listener(lambda key, menu, previous: changes.append((key, menu, previous)))
+    menu_query.add_menu_listener(lambda key, menu: menus.append(key))
+    date = menu_query.today()
+    key = ("1", date, "lunch")
+
+    store.put("1", date, "lunch", {"Grill": ["Burger"]}, {"tags": ["halal"], "dishes": [1]})
+    store.flush()
+    assert menu_query.sync_from_store() == 1
+    assert changes == [(key, {"Grill": ["Burger"]}, None)]
+    assert menus == [key]
+    assert menu_query.menu_cache.get(key) == {"Grill": ["Burger"]}
+    assert menu_query.filter_menu(date, "lunch", 1, {"Grill": ["Burger"]},
+                                  menu_query.DietFilter(frozenset({"halal"}), frozenset())) == {"Grill": ["Burger"]}
+
+    assert menu_query.sync_from_store() == 0  # unchanged rows are skipped
+
+    store.put("1", date, "lunch", {"Grill": ["Pizza"]})
+    store.flush()
+    assert menu_query.sync_from_store() == 1
+    assert changes[-1] == (key, {"Grill": ["Pizza"]}, {"Grill": ["Burger"]})
+
+
+def test_older_rows_do_not_replace_a_newer_load(store):
+    changes = []
+    menu_query.add_change_listener(lambda *args: changes.append(args))
+    date = menu_query.today()
+    key = ("1", date, "lunch")
+
+    store.put("1", date, "lunch", {"Grill": ["Burger"]})
+    store.flush()
+    time.sleep(0.01)
+    menu_query._record_hash(key, {"Grill": ["Pizza"]}, None)  # loaded here after the row was written
+    changes.clear()
+
+    assert menu_query.sync_from_store() == 0
+    assert changes == []
+
+
+def test_past_dates_are_not_synced(store):
+    store.put("1", "2000-01-01", "lunch", {"Grill": ["Burger"]})
+    store.flush()
+    assert menu_query.sync_from_store() == 0
+
+
+def test_known_tags_come_from_stored_menus(store):
+    store.put("1", menu_query.today(), "lunch", {"Grill": ["Burger"]}, {"tags": ["halal", "tree nut"], "dishes": [3]})
+    store.put("1", "2000-01-01", "lunch", {"Grill": ["Burger"]}, {"tags": ["kosher"], "dishes": [1]})
+    store.flush()
+    assert menu_query.known_tags() == {"halal", "tree nut"}
@@ -0,0 +1,44 @@
+"""
+tests/test_parsers.py
+
+Golden-file checks for utils.parser over fixtures/netnutrition (see
+fixtures/goldens.py): every backend must reproduce each golden exactly,
+including category order, and the backends must agree with each other.
+"""
+
+import json
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from fixtures.goldens import cases
+from utils.parser import HAS_LXML
+
+BACKENDS = ["bs4"] + (["lxml"] if HAS_LXML else [])
+CASES = list(cases())
+CASE_IDS = [case[0] for case in CASES]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("name, golden_path, parse, html", CASES, ids=CASE_IDS)
+def test_parser_reproduces_golden(name, golden_path, parse, html, backend):
+    with open(golden_path, encoding="utf-8") as file:
+        golden = json.load(file)
+    result = json.loads(json.dumps(parse(html, backend=backend)))
+    assert result == golden
+    # The bots render categories in dict order
+    assert list(result) == list(golden)
+
+
+@pytest.mark.skipif(not HAS_LXML, reason="lxml is not installed")
+@pytest.mark.parametrize("name, golden_path, parse, html", CASES, ids=CASE_IDS)
+def test_backends_agree(name, golden_path, parse, html):
+    bs4_result, lxml_result = parse(html, backend="bs4"), parse(html, backend="lxml")
+    assert lxml_result == bs4_result
+    assert list(lxml_result) == list(bs4_result)
+
+
+def test_corpus_has_captured_responses():
+    captured = {name.split("_")[0] for name in CASE_IDS if "_captured_" in name}
+    if not captured:
+        pytest.skip("no real NetNutrition responses in fixtures/netnutrition; record some with fixtures/capture.py")
+    assert captured == {"itemPanel", "menuPanel"}
@@ -0,0 +1,145 @@
+"""
+tests/test_resilience.py
+
+Retry policy, circuit breaker, and what fetch_menu serves while upstream is down.
+"""
+
+import time
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+import requests
+import services.menu_query as menu_query
+import services.resilience as resilience
+from services.resilience import CircuitBreaker, CircuitOpenError, is_transient, with_retries
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(response=response)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr(resilience.time, "sleep", slept.append)
+    monkeypatch.setattr(resilience.random, "uniform", lambda low, high: high)
+    return slept
+
+
+def failing(*errors):
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return "ok"
+    return fn, calls
+
+
+@pytest.mark.parametrize("error, transient", [
+    (requests.ConnectionError(), True),
+    (requests.ConnectTimeout(), True),
+    (requests.ReadTimeout(), False),
+    (http_error(429), True),
+    (http_error(503), True),
+    (http_error(404), False),
+    (ValueError(), False),
+    (CircuitOpenError(), False),
+])
+def test_is_transient(error, transient):
+    assert is_transient(error) is transient
+
+
+def test_transient_errors_are_retried_with_backoff(sleeps):
+    fn, calls = failing(requests.ConnectionError(), http_error(502))
+    assert with_retries(fn, attempts=3, base_delay=0.1, max_delay=1) == "ok"
+    assert len(calls) == 3
+    assert sleeps == [0.1, 0.2]
+
+
+def test_gives_up_after_the_last_attempt(sleeps):
+    fn, calls = failing(*[requests.ConnectionError()] * 3)
+    with pytest.raises(requests.ConnectionError):
+        with_retries(fn, attempts=3)
+    assert len(calls) == 3
+
+
+def test_read_timeouts_are_not_retried(sleeps):
+    fn, calls = failing(requests.ReadTimeout())
+    with pytest.raises(requests.ReadTimeout):
+        with_retries(fn, attempts=3)
+    assert len(calls) == 1 and sleeps == []
+
+
+def test_no_retry_starts_past_the_deadline(sleeps):
+    fn, calls = failing(requests.ConnectionError(), requests.ConnectionError())
+    with pytest.raises(requests.ConnectionError):
+        with_retries(fn, attempts=5, base_delay=1, max_delay=1, deadline=0.5)
+    assert len(calls) == 1 and sleeps == []
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    fn, calls = failing(ValueError(), ValueError())
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            breaker.call(fn)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.call(fn)
+    assert len(calls) == 2
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    fn, _ = failing(ValueError())
+    with pytest.raises(ValueError):
+        breaker.call(fn)
+    assert breaker.call(fn) == "ok"
+    with pytest.raises(ValueError):
+        breaker.call(failing(ValueError())[0])
+    assert breaker.state == "closed"
+
+
+def test_half_open_trial_closes_or_reopens():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    with pytest.raises(ValueError):
+        breaker.call(failing(ValueError())[0])
+    time.sleep(0.06)
+    assert breaker.state == "half-open"
+    with pytest.raises(ValueError):
+        breaker.call(failing(ValueError())[0])
+    assert breaker.state == "open"
+    time.sleep(0.06)
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == "closed"
+
+
+def test_every_retried_attempt_counts_towards_the_breaker(sleeps):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    fn, calls = failing(*[requests.ConnectionError()] * 5)
+    with pytest.raises(CircuitOpenError):
+        with_retries(lambda: breaker.call(fn), attempts=5)
+    assert len(calls) == 2
+
+
+def test_stale_menu_carries_its_age_while_the_circuit_is_open(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    with pytest.raises(ValueError):
+        breaker.call(failing(ValueError())[0])
+    monkeypatch.setattr(menu_query, "breaker", breaker)
+    monkeypatch.setattr(menu_query, "_load_menu", lambda *args: breaker.call(lambda: None))
+    key = ("1", menu_query.today(), "lunch")
+    menu_query.menu_cache.set(key, {"Grill": ["Burger"]}, age=menu_query.menu_cache.ttl + 60)
+    try:
+        menu, as_of = menu_query.fetch_menu(key[1], "lunch", 1)
+        assert menu == {"Grill": ["Burger"]}
+        assert as_of == pytest.approx(time.time() - menu_query.menu_cache.ttl - 60, abs=5)
+
+        monkeypatch.setattr(menu_query, "breaker", CircuitBreaker())
+        assert menu_query.fetch_menu(key[1], "lunch", 1) == ({"Grill": ["Burger"]}, None)
+    finally:
+        menu_query.menu_cache.invalidate(key)
@@ -0,0 +1,100 @@
+"""
+tests/test_shared_cache.py
+
+CoordinatedCache against the in-process MemoryBackend and a SQLite file.
+"""
+
+import threading
+import time
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from services.shared_cache import CoordinatedCache, MemoryBackend, SQLiteBackend
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBackend()
+    return SQLiteBackend(str(tmp_path / "shared.sqlite3"))
+
+
+def test_concurrent_loads_are_coalesced(backend):
+    cache = CoordinatedCache(backend, lease_ttl=5, wait=5, poll_interval=0.01)
+    calls = []
+    results = []
+    barrier = threading.Barrier(8)
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.1)
+        return {"menu": ["Grits"]}
+
+    def user():
+        barrier.wait()
+        results.append(cache.get_or_load("menu:1", loader))
+
+    threads = [threading.Thread(target=user) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{"menu": ["Grits"]}] * 8
+
+
+def test_fresh_value_is_reused_and_stale_value_reloaded(backend):
+    backend.set("menu:1", "old", ttl=60)
+    assert CoordinatedCache(backend, fresh_for=60).get_or_load("menu:1", lambda: "new") == "old"
+    assert CoordinatedCache(backend, fresh_for=0).get_or_load("menu:1", lambda: "new") == "new"
+    assert backend.get("menu:1")[0] == "new"
+
+
+def test_waits_for_the_lease_holder_instead_of_loading(backend):
+    token = backend.acquire("load:menu:1", 5)
+    assert token is not None
+    assert backend.acquire("load:menu:1", 5) is None
+
+    def holder():
+        time.sleep(0.1)
+        backend.set("menu:1", "from holder", ttl=60)
+        backend.release("load:menu:1", token)
+
+    threading.Thread(target=holder).start()
+    cache = CoordinatedCache(backend, fresh_for=0, wait=5, poll_interval=0.01)
+    assert cache.get_or_load("menu:1", lambda: pytest.fail("loaded while the lease was held")) == "from holder"
+
+
+def test_gives_up_while_the_lease_is_held(backend):
+    backend.acquire("load:menu:1", 5)
+    cache = CoordinatedCache(backend, wait=0.1, poll_interval=0.01)
+    with pytest.raises(TimeoutError):
+        cache.get_or_load("menu:1", lambda: pytest.fail("loaded while the lease was held"))
+
+
+def test_expired_lease_is_taken_over(backend):
+    backend.acquire("load:menu:1", 0.05)  # holder died without releasing
+    cache = CoordinatedCache(backend, wait=5, poll_interval=0.01)
+    assert cache.get_or_load("menu:1", lambda: "reloaded") == "reloaded"
+
+
+def test_failed_load_releases_the_lease(backend):
+    cache = CoordinatedCache(backend, wait=5, poll_interval=0.01)
+
+    def failing():
+        raise RuntimeError("upstream down")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_load("menu:1", failing)
+    assert cache.get_or_load("menu:1", lambda: "recovered") == "recovered"
+
+
+def test_stale_release_token_is_ignored(backend):
+    backend.acquire("load:menu:1", 0.05)
+    time.sleep(0.1)
+    token = backend.acquire("load:menu:1", 5)
+    backend.release("load:menu:1", "someone else")
+    assert backend.acquire("load:menu:1", 5) is None
+    backend.release("load:menu:1", token)
+    assert backend.acquire("load:menu:1", 5) is not None
@@ -0,0 +1,90 @@
+"""
+tests/test_singleflight.py
+
+SingleFlight: one call per key in flight, results and errors shared with waiters.
+"""
+
+import threading
+import time
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from services.singleflight import SingleFlight
+
+
+def run_concurrently(n, target):
+    results, errors = [], []
+    barrier = threading.Barrier(n)
+
+    def worker():
+        barrier.wait()
+        try:
+            results.append(target())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_concurrent_calls_share_one_result():
+    flight, calls = SingleFlight(), []
+
+    def fn():
+        calls.append(1)
+        time.sleep(0.1)
+        return "menu"
+
+    results, errors = run_concurrently(8, lambda: flight.do("key", fn))
+    assert calls == [1]
+    assert results == ["menu"] * 8 and errors == []
+    assert flight.in_flight() == 0
+
+
+def test_error_reaches_every_waiter():
+    flight, calls = SingleFlight(), []
+
+    def fn():
+        calls.append(1)
+        time.sleep(0.1)
+        raise RuntimeError("upstream down")
+
+    results, errors = run_concurrently(5, lambda: flight.do("key", fn))
+    assert calls == [1] and results == []
+    assert len(errors) == 5 and all(isinstance(e, RuntimeError) for e in errors)
+    # The failed call is forgotten: the next one runs again
+    assert flight.do("key", lambda: "recovered") == "recovered"
+
+
+def test_different_keys_do_not_wait_for_each_other():
+    flight, release = SingleFlight(), threading.Event()
+    slow = threading.Thread(target=lambda: flight.do("slow", release.wait))
+    slow.start()
+    try:
+        assert flight.do("fast", lambda: "done") == "done"
+    finally:
+        release.set()
+        slow.join()
+
+
+def test_waiter_times_out_while_the_call_keeps_running():
+    flight, release, finished = SingleFlight(timeout=30), threading.Event(), []
+
+    def fn():
+        release.wait()
+        finished.append(1)
+        return "late"
+
+    leader = threading.Thread(target=lambda: flight.do("key", fn))
+    leader.start()
+    while flight.in_flight() == 0:
+        time.sleep(0.001)
+    with pytest.raises(TimeoutError):
+        flight.do("key", lambda: pytest.fail("ran a second call"), timeout=0.05)
+    release.set()
+    leader.join()
+    assert finished == [1]
@@ -0,0 +1,56 @@
+"""
+tests/test_user_state.py
+
+UserStateStore: write-through persistence, LRU and idle eviction.
+"""
+
+import time
+import os, sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from services.user_state import UserStateStore
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "users.sqlite3")
+
+
+def test_updates_are_written_through(path):
+    store = UserStateStore(path)
+    store.update("telegram", 1, language="Spanish", stage=0, hall_pid="2", diet="vegan")
+    reopened = UserStateStore(path).get("telegram", 1)
+    assert (reopened.language, reopened.stage, reopened.hall_pid, reopened.diet) == ("Spanish", 0, "2", "vegan")
+
+
+def test_bots_are_kept_apart(path):
+    store = UserStateStore(path)
+    store.update("telegram", 1, language="Spanish")
+    assert store.get("discord", 1, default_language="Chinese").language == "Chinese"
+
+
+def test_unknown_fields_are_rejected(path):
+    with pytest.raises(ValueError):
+        UserStateStore(path).update("telegram", 1, colour="blue")
+
+
+def test_least_recently_used_users_leave_memory_but_not_disk(path):
+    store = UserStateStore(path, max_users=2)
+    store.update("telegram", 1, language="Spanish")
+    store.update("telegram", 2, language="Chinese")
+    store.get("telegram", 1)
+    store.update("telegram", 3, language="English")
+    assert len(store) == 2
+    assert ("telegram", 2) not in store._users
+    assert store.get("telegram", 2).language == "Chinese"
+
+
+def test_idle_users_are_evicted_and_lose_their_conversation(path):
+    store = UserStateStore(path, idle_ttl=0.05)
+    store.update("telegram", 1, language="Spanish", stage=1, hall_pid="2")
+    time.sleep(0.06)
+    store.get("telegram", 2)
+    assert len(store) == 1
+    state = store.get("telegram", 1)
+    assert state.language == "Spanish"
+    assert state.stage is None and state.hall_pid is None
@@ -0,0 +1,107 @@
+"""
+utils/chat_executor.py
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Hashable
+
+
+def percentile(samples, p: float) -> float:
+    """Nearest-rank percentile of a sequence of numbers, 0 when empty."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+class ChatExecutor:
+    """
+    Bounded worker pool for slow bot handlers.
+
+    Jobs for different chats run concurrently on up to ``workers`` threads;
+    jobs for the same chat run one at a time, in submission order, so a user
+    never sees replies out of order. Exposes the queue depth and recent
+    handler-time percentiles through ``stats()``.
+    """
+
+    def __init__(self, workers: int, name: str = "handler", samples: int = 1000):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._queues: dict[Hashable, deque] = {}
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._durations = deque(maxlen=samples)
+
+    def submit(self, chat_id: Hashable, fn: Callable, *args):
+        with self._lock:
+            self._queued += 1
+            queue = self._queues.get(chat_id)
+            if queue is not None:
+                # A worker is already draining this chat; it will pick the job up
+                queue.append((fn, args))
+                return
+            self._queues[chat_id] = deque([(fn, args)])
+        self._pool.submit(self._drain, chat_id)
+
+    def _drain(self, chat_id: Hashable):
+        while True:
+            with self._lock:
+                queue = self._queues[chat_id]
+                if not queue:
+                    del self._queues[chat_id]
+                    return
+                fn, args = queue.popleft()
+                self._queued -= 1
+                self._running += 1
+            started = time.perf_counter()
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"[WARN] handler for chat {chat_id} failed: {e}")
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._durations.append(time.perf_counter() - started)
+
+    def queue_depth(self) -> int:
+        return self._queued
+
+    def stats(self) -> dict:
+        with self._lock:
+            durations = list(self._durations)
+            queued, running = self._queued, self._running
+        return {
+            'queued': queued,
+            'running': running,
+            'handled': len(durations),
+            'p50': round(percentile(durations, 50), 4),
+            'p95': round(percentile(durations, 95), 4),
+        }
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+
+if __name__ == "__main__":
+    # Synthetic burst: 200 period_choice-like jobs from 50 chats, each blocking
+    # ~50-300 ms like an upstream call, on a pool of 8 workers.
+    import random
+    executor = ChatExecutor(workers=8)
+    order: dict[int, list[int]] = {}
+    peak_depth = 0
+
+    def job(chat, seq):
+        time.sleep(random.uniform(0.05, 0.3))
+        order.setdefault(chat, []).append(seq)
+
+    started = time.perf_counter()
+    for seq in range(200):
+        executor.submit(seq % 50, job, seq % 50, seq)
+        peak_depth = max(peak_depth, executor.queue_depth())
+    executor.shutdown()
+    print({**executor.stats(), 'peak_queue_depth': peak_depth,
+           'wall_time': round(time.perf_counter() - started, 3),
+           'per_chat_order_kept': all(seqs == sorted(seqs) for seqs in order.values())})
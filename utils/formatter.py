@@ -1,12 +1,22 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
 def format_menu(menu_data):
     """
     Takes a complex menu data structure and returns a formatted string
     with only the category names and dish names.
     """
-    formatted_text = ""
+    lines = []
     for category, items in menu_data.items():
-        formatted_text += f"*{category}:*\n"  # Category name
-        for item in items:
-            formatted_text += f"    {item}\n"  # Dish name
-        formatted_text += "\n"  # Add a newline for better separation between categories
-    return formatted_text
+        lines.append(f"*{category}:*")  # Category name
+        lines.extend(f"    {item}" for item in items)  # Dish names
+        lines.append("")  # Add a newline for better separation between categories
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def format_as_of(timestamp, tz="America/New_York"):
+    """
+    Format an epoch timestamp (e.g. when a fallback menu was fetched) as
+    'YYYY-MM-DD HH:MM' in the dining halls' time zone.
+    """
+    return datetime.fromtimestamp(timestamp, ZoneInfo(tz)).strftime('%Y-%m-%d %H:%M')
@@ -0,0 +1,132 @@
+"""
+utils/metrics.py
+
+Process-wide counters, per-stage latency histograms and gauges, exposed in
+the Prometheus text format on a local HTTP endpoint and, for stage timings,
+as one JSON log line per measurement.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+JSON_LOGS = os.getenv('METRICS_JSON_LOGS', '1') == '1'
+
+_lock = threading.Lock()
+_counters: dict[tuple, float] = {}    # (name, sorted label items) -> value
+_histograms: dict[str, list] = {}     # stage -> [bucket counts..., +Inf count, sum]
+_gauges: dict[str, object] = {}       # name -> zero-argument callable
+
+
+def inc(name: str, value: float = 1, **labels):
+    """Increase counter ``name`` with the given labels."""
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(stage: str, seconds: float, **fields):
+    """Record one duration for ``stage`` and log it as JSON."""
+    with _lock:
+        histogram = _histograms.setdefault(stage, [0] * (len(BUCKETS) + 2))
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram[i] += 1
+        histogram[-2] += 1
+        histogram[-1] += seconds
+    if JSON_LOGS:
+        log_json("stage", stage=stage, ms=round(seconds * 1000, 3), **fields)
+
+
+@contextmanager
+def timed(stage: str, **fields):
+    """Time the enclosed block as ``stage``; the duration is recorded even if it raises."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - started, **fields)
+
+
+def register_gauge(name: str, read):
+    """Expose ``read()`` as gauge ``name``; it is evaluated on every scrape."""
+    with _lock:
+        _gauges[name] = read
+
+
+def log_json(event: str, **fields):
+    print(json.dumps({'ts': round(time.time(), 3), 'event': event, **fields}, default=str), file=sys.stderr)
+
+
+def _labels(items) -> str:
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+def render() -> str:
+    """Current metrics in the Prometheus text exposition format."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {stage: list(values) for stage, values in _histograms.items()}
+        gauges = dict(_gauges)
+
+    lines = []
+    for name in sorted({name for name, _ in counters}):
+        lines.append(f"# TYPE wolfbite_{name} counter")
+        for (counter, labels), value in sorted(counters.items()):
+            if counter == name:
+                lines.append(f"wolfbite_{name}{_labels(labels)} {value}")
+
+    lines.append("# TYPE wolfbite_stage_seconds histogram")
+    for stage, values in sorted(histograms.items()):
+        for bound, count in zip(BUCKETS, values):
+            lines.append(f'wolfbite_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+        lines.append(f'wolfbite_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {values[-2]}')
+        lines.append(f'wolfbite_stage_seconds_count{{stage="{stage}"}} {values[-2]}')
+        lines.append(f'wolfbite_stage_seconds_sum{{stage="{stage}"}} {values[-1]}')
+
+    for name, read in sorted(gauges.items()):
+        try:
+            value = float(read())
+        except Exception:
+            continue
+        lines.append(f"# TYPE wolfbite_{name} gauge")
+        lines.append(f"wolfbite_{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+_server = None
+
+def start_metrics_server(host: str = "127.0.0.1", port: int = 9108):
+    """Serve /metrics on a daemon thread. Port 0 disables it; repeated calls are no-ops."""
+    global _server
+    if _server is not None or not port:
+        return _server
+    # Imported here so that processes which only record metrics skip http.server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    _server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    return _server
@@ -1,6 +1,15 @@
-from bs4 import BeautifulSoup
+import datetime
+import importlib.util
+import os
 import re
+
+# bs4 and lxml are imported on first parse, not at startup. lxml is optional.
+HAS_LXML = importlib.util.find_spec("lxml") is not None
+
+# 'lxml' streams the HTML once without building a tree; 'bs4' is the reference implementation
+PARSER_BACKEND = os.getenv("PARSER_BACKEND", "lxml" if HAS_LXML else "bs4")
 def parse_menu_deprecated(html_content):
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(html_content, 'html.parser')
     categories = soup.find_all("div", class_="dining-menu-category")
     
@@ -21,7 +30,7 @@ def parse_menu_deprecated(html_content):
 
     return menu_dict
 
-def parse_menu(html: str) -> dict[str, list[str]]:
+def parse_menu(html: str, backend: str = None) -> dict[str, list[str]]:
     """
     Parse NetNutrition page HTML into
         {category name: [dish 1, dish 2, ...], ...}
@@ -30,14 +39,56 @@ def parse_menu(html: str) -> dict[str, list[str]]:
     ----------
     html : str
         Raw HTML string
+    backend : str, optional
+        'lxml' or 'bs4', defaults to PARSER_BACKEND. Both produce identical
+        output (checked against fixtures/netnutrition by tests/test_parsers.py).
 
     Returns
     -------
     dict[str, list[str]]
     """
+    return {category: [dish for dish, _ in items]
+            for category, items in parse_menu_items(html, backend).items()}
+
+
+def parse_menu_items(html: str, backend: str = None) -> dict[str, list[tuple[str, tuple[str, ...]]]]:
+    """
+    Like parse_menu, but keeps each dish's dietary/allergen icons:
+        {category name: [(dish, (tag label, ...)), ...], ...}
+
+    Tag labels are the icons' <img> alt (or title) and <span> title texts,
+    e.g. ('Vegan', 'Contains Gluten'), in page order without duplicates.
+    Dishes and their order are exactly those of parse_menu.
+    """
+    if (backend or PARSER_BACKEND) == "lxml":
+        return _stream(html, _MenuTarget())
+    return _parse_menu_items_soup(html)
+
+
+def parse_unit_menu_panel(html: str, backend: str = None) -> dict[str, dict[str, int]]:
+    """
+    Parse a unit's menuPanel HTML into
+        {'YYYY-MM-DD': {meal name: menuOid, ...}, ...}
+    """
+    if (backend or PARSER_BACKEND) == "lxml":
+        return _stream(html, _UnitMenuPanelTarget())
+    return _parse_unit_menu_panel_soup(html)
+
+
+def _icon_label(tag: str, attrib) -> str:
+    """Tag label carried by an icon element inside a dish link, or ''."""
+    if tag == "img":
+        return (attrib.get("alt") or attrib.get("title") or "").strip()
+    if tag == "span":
+        return (attrib.get("title") or "").strip()
+    return ""
+
+
+def _parse_menu_items_soup(html: str) -> dict[str, list[tuple[str, tuple[str, ...]]]]:
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(html, "html.parser")
 
-    menu: dict[str, list[str]] = {}
+    menu: dict[str, list[tuple[str, tuple[str, ...]]]] = {}
     current_category = None
 
     # Each row in NetNutrition is in <tr>; use class to determine type
@@ -65,8 +116,210 @@ def parse_menu(html: str) -> dict[str, list[str]]:
             if item_anchor:
                 # Dish name has several <span> (icons), only keep pure text
                 item_text = re.split(r"\s{2,}", item_anchor.get_text(" ", strip=True))[0]
-                menu[current_category].append(item_text)
+                labels = (_icon_label(icon.name, icon) for icon in item_anchor.find_all(["img", "span"]))
+                menu[current_category].append((item_text, tuple(dict.fromkeys(label for label in labels if label))))
 
     # Remove categories that might be empty
     return {k: v for k, v in menu.items() if v}
 
+
+def _parse_unit_menu_panel_soup(html: str) -> dict[str, dict[str, int]]:
+    from bs4 import BeautifulSoup
+    soup, out = BeautifulSoup(html, "html.parser"), {}
+    for card in soup.select("section.card"):
+        header = card.find("header", class_="card-title")
+        if not header:
+            continue
+        date_key = datetime.datetime.strptime(
+            header.get_text(strip=True), "%A, %B %d, %Y"
+        ).strftime("%Y-%m-%d")
+
+        out[date_key] = {}
+        for link in card.select("a.cbo_nn_menuLink"):
+            meal = link.get_text(strip=True)
+            if m := re.search(r"\((\d+)\)", link.get("onclick", "")):
+                out[date_key][meal] = int(m.group(1))
+    return out
+
+
+# --- Streaming backend -------------------------------------------------------
+# lxml parser targets receive start/end/data events and never build a tree.
+# Text is gathered per text node (consecutive data() chunks are merged) so that
+# stripping and joining behave exactly like BeautifulSoup's get_text().
+
+def _stream(html: str, target):
+    if not html.strip():
+        return target.close()
+    from lxml import etree
+    parser = etree.HTMLParser(target=target)
+    parser.feed(html)
+    return parser.close()
+
+
+class _TextTarget:
+    """Base target: tracks depth and collects text nodes while a capture is open."""
+
+    def __init__(self):
+        self._depth = 0
+        self._skip = 0  # inside <script>/<style>, which get_text() ignores
+        self._buffer = []
+        self._capture = None  # (depth, [text nodes]) of the element being read
+
+    def _flush(self):
+        if self._buffer:
+            if self._capture is not None:
+                self._capture[1].append("".join(self._buffer))
+            self._buffer = []
+
+    def start(self, tag, attrib):
+        self._flush()
+        self._depth += 1
+        if tag in ("script", "style"):
+            self._skip += 1
+        self.open(tag, attrib)
+
+    def end(self, tag):
+        self._flush()
+        if tag in ("script", "style"):
+            self._skip -= 1
+        if self._capture is not None and self._capture[0] == self._depth:
+            texts = [t.strip() for t in self._capture[1] if t.strip()]
+            self._capture = None
+            self.captured(texts)
+        self._depth -= 1
+        self.closed(tag)
+
+    def data(self, data):
+        if not self._skip:
+            self._buffer.append(data)
+
+    def comment(self, text):
+        self._flush()
+
+    def pi(self, target, data):
+        self._flush()
+
+    def _begin_capture(self):
+        self._capture = (self._depth, [])
+
+    def open(self, tag, attrib):
+        pass
+
+    def captured(self, texts):
+        pass
+
+    def closed(self, tag):
+        pass
+
+
+class _MenuTarget(_TextTarget):
+
+    def __init__(self):
+        super().__init__()
+        self.menu: dict[str, list[tuple[str, tuple[str, ...]]]] = {}
+        self.category = None
+        self._rows = []  # per open <tr>: [kind, matched]
+        self._reading = None  # kind of the row whose category / dish is being captured
+        self._labels = {}  # icon labels of the dish link being read, as an ordered set
+
+    def _classified_row(self):
+        # bs4 searches a group/item row's whole subtree, nested unclassed <tr>s included
+        for row in reversed(self._rows):
+            if row[0] is not None:
+                return row
+        return None
+
+    def open(self, tag, attrib):
+        if tag == "tr":
+            classes = attrib.get("class", "").split()
+            if any("cbo_nn_itemGroupRow" in c for c in classes):
+                kind = "group"
+            elif any("cbo_nn_itemPrimaryRow" in c or "cbo_nn_itemAlternateRow" in c for c in classes):
+                kind = "item"
+            else:
+                kind = None
+            self._rows.append([kind, False])
+            return
+        if self._capture is not None:
+            if self._reading == "item":
+                label = _icon_label(tag, attrib)
+                if label:
+                    self._labels[label] = None
+            return
+        row = self._classified_row()
+        if row is None or row[1]:
+            return
+        kind = row[0]
+        if kind == "group" and tag == "div" and attrib.get("role") == "button":
+            row[1] = True
+            self._reading = kind
+            self._begin_capture()
+        elif (kind == "item" and tag == "a" and self.category
+              and "cbo_nn_itemHover" in attrib.get("class", "").split()):
+            row[1] = True
+            self._reading = kind
+            self._labels = {}
+            self._begin_capture()
+
+    def captured(self, texts):
+        if self._reading == "group":
+            self.category = "".join(texts)
+            self.menu.setdefault(self.category, [])
+        else:
+            self.menu[self.category].append((re.split(r"\s{2,}", " ".join(texts))[0], tuple(self._labels)))
+        self._reading = None
+
+    def closed(self, tag):
+        if tag == "tr" and self._rows:
+            self._rows.pop()
+
+    def close(self):
+        return {k: v for k, v in self.menu.items() if v}
+
+
+class _UnitMenuPanelTarget(_TextTarget):
+
+    def __init__(self):
+        super().__init__()
+        self.out: dict[str, dict[str, int]] = {}
+        self._cards = []  # per open <section class="card">: {'header': texts, 'links': [(texts, onclick)]}
+        self._reading = None
+
+    def open(self, tag, attrib):
+        classes = attrib.get("class", "").split()
+        if tag == "section":
+            self._cards.append({'header': None, 'links': []} if "card" in classes else None)
+            return
+        cards = [c for c in self._cards if c is not None]
+        if self._capture is not None or not cards:
+            return
+        if tag == "header" and "card-title" in classes and any(c['header'] is None for c in cards):
+            self._reading = ('header', [c for c in cards if c['header'] is None])
+            self._begin_capture()
+        elif tag == "a" and "cbo_nn_menuLink" in classes:
+            self._reading = ('link', cards, attrib.get("onclick", ""))
+            self._begin_capture()
+
+    def captured(self, texts):
+        if self._reading[0] == 'header':
+            for card in self._reading[1]:
+                card['header'] = texts
+        else:
+            for card in self._reading[1]:
+                card['links'].append((texts, self._reading[2]))
+        self._reading = None
+
+    def closed(self, tag):
+        if tag != "section" or not self._cards:
+            return
+        card = self._cards.pop()
+        if card is None or card['header'] is None:
+            return
+        date_key = datetime.datetime.strptime("".join(card['header']), "%A, %B %d, %Y").strftime("%Y-%m-%d")
+        self.out[date_key] = {}
+        for texts, onclick in card['links']:
+            if m := re.search(r"\((\d+)\)", onclick):
+                self.out[date_key]["".join(texts)] = int(m.group(1))
+
+    def close(self):
+        return self.out
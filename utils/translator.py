@@ -1,30 +1,127 @@
+import atexit
 import json
 import os
+import tempfile
+import threading
+import time
+from collections import Counter
+
+TRANSLATIONS_DIR = os.path.join(os.path.dirname(__file__), '..', 'translations')
+# How often (seconds) a language file's mtime is re-checked for hot reload
+RELOAD_CHECK_INTERVAL = 1.0
+
+_tables = {}  # language -> {'mtime': ..., 'checked': ..., 'data': {...}}
+_tables_lock = threading.Lock()
+
+UNTRANSLATED_PATH = os.path.join(TRANSLATIONS_DIR, 'untranslated.json')
+UNTRANSLATED_FLUSH_INTERVAL = 5.0
+
+_pending = Counter()  # (language, text) -> times seen since the last flush
+_pending_lock = threading.Lock()
+_file_lock = threading.Lock()
+_writer = None
 
 def load_translations(language):
     """
-    Load translation dictionary for a given language.
+    Return the translation dictionary for a given language.
+    The file is read once and kept in memory, shared by every caller;
+    it is only re-read when its mtime changes.
     """
-    path = f"translations/{language}.json"
-    if os.path.exists(path):
-        with open(path, 'r', encoding='utf-8') as file:
-            return json.load(file)
-    return {}
+    table = _tables.get(language)
+    now = time.monotonic()
+    if table and now - table['checked'] < RELOAD_CHECK_INTERVAL:
+        return table['data']
+
+    with _tables_lock:
+        path = os.path.join(TRANSLATIONS_DIR, f"{language}.json")
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        table = _tables.get(language)
+        if table is None or table['mtime'] != mtime:
+            data = {}
+            if mtime is not None:
+                with open(path, 'r', encoding='utf-8') as file:
+                    data = json.load(file)
+            table = {'mtime': mtime, 'data': data}
+        table['checked'] = now
+        _tables[language] = table
+        return table['data']
+
+def translations_version(language):
+    """
+    Identify the currently loaded revision of a language file (its mtime),
+    so callers caching translated output can tell when it went out of date.
+    """
+    load_translations(language)
+    return _tables[language]['mtime']
 
 def log_untranslated(text, language):
-    path = "translations/untranslated.json"
+    """
+    Record a missing translation. Only touches an in-memory counter; the
+    background writer merges it into untranslated.json every few seconds.
+    """
+    with _pending_lock:
+        _pending[(language, text)] += 1
+        _start_writer()
+
+def _read_untranslated():
     try:
-        with open(path, 'r+', encoding='utf-8') as file:
+        with open(UNTRANSLATED_PATH, 'r', encoding='utf-8') as file:
             data = json.load(file)
-            if language not in data:
-                data[language] = []
-            if text not in data[language]:  # Check if the text is already logged
-                data[language].append(text)
-                file.seek(0)
-                json.dump(data, file, indent=4)
-    except FileNotFoundError:
-        with open(path, 'w', encoding='utf-8') as file:
-            json.dump({language: [text]}, file, indent=4)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    # Older files hold a plain list of texts per language
+    return {language: dict.fromkeys(texts, 0) if isinstance(texts, list) else texts
+            for language, texts in data.items()}
+
+def flush_untranslated():
+    """
+    Merge pending counts into untranslated.json, hottest strings first.
+    The file is replaced atomically (temp file + rename) so readers and
+    concurrent writers never see a half-written file.
+    """
+    with _pending_lock:
+        batch = _pending.copy()
+        _pending.clear()
+    if not batch:
+        return
+    tmp_path = None
+    try:
+        with _file_lock:
+            data = _read_untranslated()
+            for (language, text), count in batch.items():
+                counts = data.setdefault(language, {})
+                counts[text] = counts.get(text, 0) + count
+            data = {language: dict(sorted(counts.items(), key=lambda kv: -kv[1]))
+                    for language, counts in data.items()}
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(UNTRANSLATED_PATH), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                json.dump(data, file, indent=4, ensure_ascii=False)
+            os.replace(tmp_path, UNTRANSLATED_PATH)
+    except BaseException:
+        # Keep the counts for the next flush and leave no temp file behind
+        with _pending_lock:
+            _pending.update(batch)
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def _start_writer():
+    global _writer
+    if _writer is not None:
+        return
+    def run():
+        while True:
+            time.sleep(UNTRANSLATED_FLUSH_INTERVAL)
+            try:
+                flush_untranslated()
+            except OSError as e:
+                print(f"[WARN] could not write {UNTRANSLATED_PATH}: {e}")
+    _writer = threading.Thread(target=run, name="untranslated-writer", daemon=True)
+    _writer.start()
+    atexit.register(flush_untranslated)
 
 
 def translate_text(text, language):
@@ -39,3 +136,18 @@ def translate_text(text, language):
         return text  # Use the original text if no translation is found
     return translations.get(text, text)
 
+
+def translate_many(texts, language):
+    """
+    Translate a batch of texts (e.g. a whole menu) with a single table lookup.
+    """
+    if language == 'English':
+        return list(texts)
+    translations = load_translations(language)
+    out = []
+    for text in texts:
+        if text not in translations:
+            log_untranslated(text, language)
+        out.append(translations.get(text, text))
+    return out
+